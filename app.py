@@ -1,11 +1,18 @@
-import io
-import zipfile
+from dataclasses import replace
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import BinaryIO, Dict, List, Tuple
 
 import streamlit as st
 from src.pdf_workbench.basic_ops import *
+from src.pdf_workbench.docpool import Source
+from src.pdf_workbench.docstore import DocHandle
+from src.pdf_workbench.arrays import ARRAY_DTYPES, ARRAY_FORMATS
 from src.pdf_workbench.extract import *
+from src.pdf_workbench.formulas import FORMULA_MODES
+from src.pdf_workbench.jobs import job_runner
+from src.pdf_workbench.profiling import recording
+from src.pdf_workbench.saving import SAVE_PROFILES
+from src.pdf_workbench.ui import *
 from src.pdf_workbench.utils import *
 
 st.set_page_config(page_title="PDF Tools", layout="wide")
@@ -17,38 +24,106 @@ st.caption(
 uploaded = st.file_uploader(
     "Upload PDF file(s)", type=["pdf"], accept_multiple_files=True
 )
-if "pdf_store" not in st.session_state:
-    st.session_state["pdf_store"] = {}  # {filename: bytes}
+
+# one fingerprinted copy per upload, hashed in parallel; pdf_items carries
+# lightweight handles. Page metadata is read in the background.
+store = session_doc_store()
+handles: List[DocHandle] = store.add_many(
+    [(f.name, f, f.size, f.file_id) for f in uploaded or []]
+)
+# documents that running jobs still read stay put even if removed here
+store.retain(
+    [h.key for h in handles]
+    + st.session_state.get("org_doc_keys", [])
+    + [k for j in session_jobs() if j.active for k in j.doc_keys]
+)
+st.session_state["workbench_docs"] = handles
 
 if not uploaded:
     st.info("Upload one or more PDF files to begin.")
     st.stop()
 
-pdf_items: List[Tuple[str, bytes]] = []
-for f in uploaded:
-    label = f.name
-    if label not in st.session_state["pdf_store"]:
-        st.session_state["pdf_store"][label] = f.getvalue()
-    data = st.session_state["pdf_store"][label]
-    pdf_items.append((label, data))
-
-docs_for_org = []
-for f in uploaded:
-    data = f.read()
-    docs_for_org.append({"name": f.name, "data": data})
-
-st.session_state["workbench_docs"] = docs_for_org
+pdf_items: List[Tuple[str, Source]] = [(h.name, h.source) for h in handles]
 
 st.page_link("pages/organizer.py", label="Open Organizer")
+rec = st_profiling_sidebar()
+thumb_fmt, thumb_quality = st_thumb_sidebar()
 
 c1, c2, c3 = st.columns([1, 1, 1])
 merge_top = filter_top = extract_top = False
 with c1:
     merge_top = st.button("Create Merged PDF", type="primary", key="merge_top")
+    save_profile = st.selectbox(
+        "Save PDFs",
+        list(SAVE_PROFILES),
+        format_func=save_profile_label,
+        key="save_profile",
+    )
 with c2:
     filter_top = st.button("Create Filtered PDF(s)", key="filter_top")
 with c3:
     extract_top = st.button("Extract Contents (ZIP)", key="extract_top")
+    dedupe_images = st.checkbox(
+        "Store identical images once across documents", key="dedupe_images"
+    )
+    profile_name = st.selectbox(
+        "Extract",
+        ["full", "text", "tables", "images", "custom"],
+        format_func=lambda p: {
+            "full": "Everything",
+            "text": "Text only",
+            "tables": "Tables only",
+            "images": "Images only",
+            "custom": "Custom…",
+        }[p],
+        key="extract_profile",
+    )
+    if profile_name == "custom":
+        extract_profile = ExtractProfile.from_parts(
+            st.multiselect(
+                "Outputs",
+                PARTS,
+                default=["text", "combined"],
+                key="extract_parts",
+            )
+        )
+    else:
+        extract_profile = PROFILES[profile_name]
+    if extract_profile.formulas:
+        extract_profile = replace(
+            extract_profile,
+            formula_mode=st.selectbox(
+                "Formula detection",
+                FORMULA_MODES,
+                format_func=lambda m: {
+                    "text": "Any line with a math symbol",
+                    "strict": "Skip prose lines",
+                    "layout": "Use fonts and sub/superscripts",
+                }[m],
+                key="formula_mode",
+            ),
+        )
+    if extract_profile.arrays:
+        with st.expander("Image arrays"):
+            extract_profile = replace(
+                extract_profile,
+                array_format=st.selectbox(
+                    "Format",
+                    ARRAY_FORMATS,
+                    format_func=lambda f: {
+                        "encoded": "Encoded image bytes (.npy)",
+                        "npy": "Decoded pixels, HxWxC (.npy)",
+                        "npz": "Decoded pixels, compressed (.npz)",
+                    }[f],
+                    key="array_format",
+                ),
+                array_dtype=st.selectbox(
+                    "Pixel dtype", ARRAY_DTYPES, key="array_dtype"
+                ),
+                array_downscale=st.selectbox(
+                    "Downscale", [1, 2, 4, 8], key="array_downscale"
+                ),
+            )
 
 # sel_summary = st.empty()
 if "total_selected" not in st.session_state:
@@ -62,12 +137,18 @@ with mcol:
     sel_summary.metric("Pages selected", st.session_state["total_selected"])
 
 selections: Dict[str, List[int]] = {}
-for idx, (label, data) in enumerate(pdf_items):
-    with st.expander(f"{label}", expanded=(len(pdf_items) <= 2)):
-        selected = st_page_selector(
-            file_label=label, pdf_bytes=data, key_prefix=f"pdf{idx}"
-        )
-        selections[label] = selected
+for idx, h in enumerate(handles):
+    with st.expander(f"{h.name}", expanded=(len(handles) <= 2)):
+        with recording(rec):
+            selected = st_page_selector(
+                file_label=h.name,
+                source=h.source,
+                key_prefix=f"pdf{idx}",
+                doc_key=h.key,
+                fmt=thumb_fmt,
+                quality=thumb_quality,
+            )
+        selections[h.name] = selected
 
 # total_selected = sum(len(v) for v in selections.values())
 # sel_summary.metric("Pages selected", total_selected)
@@ -91,62 +172,102 @@ do_merge = merge_top or merge_bot
 do_filter = filter_top or filter_bot
 do_extract = extract_top or extract_bot
 
+# the work runs in background jobs; their ids live in session state, so
+# reruns keep showing progress and finished downloads
 if do_merge:
-    merged_bytes = merge_selected(pdf_items, selections)
-    st.success("Merged PDF ready!")
-    st.download_button(
-        "Download merged.pdf",
-        data=merged_bytes,
-        file_name="merged.pdf",
-        mime="application/pdf",
-        key="dl_merge",
-    )
+    items = list(pdf_items)
+    sel = {k: list(v) for k, v in selections.items()}
 
-if do_filter:
-    results = []
-    for label, data in pdf_items:
-        sel = selections.get(label, [])
-        out_bytes = filter_selected_per_file(label, data, sel)
-        results.append((label, out_bytes))
-
-    if len(results) == 1:
-        label, out_bytes = results[0]
-        st.success(f"Filtered PDF for **{label}** ready!")
-        st.download_button(
-            f"Download {Path(label).stem}_filtered.pdf",
-            data=out_bytes,
-            file_name=f"{Path(label).stem}_filtered.pdf",
-            mime="application/pdf",
-            key="dl_filter_single",
+    def run_merge(out: BinaryIO) -> None:
+        write_merged(items, sel, out, save_profile)
+
+    with recording(rec):
+        track_job(
+            job_runner.submit(
+                "merge",
+                run_merge,
+                label=f"Merged PDF ({save_profile})",
+                file_name="merged.pdf",
+                mime="application/pdf",
+                docs_total=len(handles),
+                pages_total=sum(
+                    len(selections.get(h.name, [])) or store.page_count(h)
+                    for h in handles
+                ),
+                doc_keys=[h.key for h in handles],
+                on_finish=store.lease(h.key for h in handles),
+            )
         )
-    else:
-        zbuf = io.BytesIO()
-        with zipfile.ZipFile(
-            zbuf, "w", compression=zipfile.ZIP_DEFLATED
-        ) as zf:
-            for label, out_bytes in results:
-                zf.writestr(f"{Path(label).stem}_filtered.pdf", out_bytes)
-        st.success("Filtered PDFs ready!")
-        st.download_button(
-            "Download filtered_pdfs.zip",
-            data=zbuf.getvalue(),
-            file_name="filtered_pdfs.zip",
-            mime="application/zip",
-            key="dl_filter_zip",
+
+if do_filter:
+    items = list(pdf_items)
+    sel = {k: list(v) for k, v in selections.items()}
+
+    def run_filter(out: BinaryIO) -> None:
+        if len(items) == 1:
+            label, data = items[0]
+            write_filtered(label, data, sel.get(label, []), out, save_profile)
+        else:
+            write_filtered_zip(items, sel, out, save_profile)
+
+    single = len(items) == 1
+    with recording(rec):
+        track_job(
+            job_runner.submit(
+                "filter",
+                run_filter,
+                label=(
+                    f"Filtered PDF for {items[0][0]} ({save_profile})"
+                    if single
+                    else f"Filtered PDFs ({save_profile})"
+                ),
+                file_name=(
+                    f"{Path(items[0][0]).stem}_filtered.pdf"
+                    if single
+                    else "filtered_pdfs.zip"
+                ),
+                mime="application/pdf" if single else "application/zip",
+                docs_total=len(handles),
+                pages_total=sum(
+                    len(selections.get(h.name, [])) or store.page_count(h)
+                    for h in handles
+                ),
+                doc_keys=[h.key for h in handles],
+                on_finish=store.lease(h.key for h in handles),
+            )
         )
 
 if do_extract:
-    st.info(
-        "Extracting… this may take a moment for large PDFs with many images/tables."
-    )
-    zbytes = build_extraction_zip(pdf_items)
-    st.success("Extraction complete!")
-    st.download_button(
-        "Download extracted_contents.zip",
-        data=zbytes,
-        file_name="extracted_contents.zip",
-        mime="application/zip",
-        key="dl_extract",
-    )
+    docs = list(handles)
+    profile, dedupe = extract_profile, dedupe_images
+
+    def run_extract(out: BinaryIO) -> None:
+        # spilled uploads are passed by path and opened by name
+        write_extraction_zip(
+            ((h.name, h.source) for h in docs),
+            out,
+            dedupe_images=dedupe,
+            profile=profile,
+            cache=True,
+        )
+
+    with recording(rec):
+        track_job(
+            job_runner.submit(
+                "extract",
+                run_extract,
+                label="Extraction",
+                file_name="extracted_contents.zip",
+                mime="application/zip",
+                docs_total=len(docs),
+                pages_total=sum(store.page_count(h) for h in docs),
+                doc_keys=[h.key for h in docs],
+                on_finish=store.lease(h.key for h in docs),
+            )
+        )
+
+st_jobs_panel()
 
 st.divider()
+
+st_profiling_panel(rec)
@@ -0,0 +1,41 @@
+import argparse
+import json
+import sys
+from typing import Dict, Tuple
+
+
+def _index(path: str) -> Dict[Tuple[str, str, int], dict]:
+    with open(path) as fh:
+        report = json.load(fh)
+    return {(r["case"], r["kind"], r["pages"]): r for r in report["results"]}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare two benchmark result files (old vs new)."
+    )
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument(
+        "--threshold", type=float, default=1.10, help="flag ratios above this"
+    )
+    ns = parser.parse_args(argv)
+
+    old, new = _index(ns.old), _index(ns.new)
+    worse = 0
+    print(f"{'case':32s} {'kind':9s} {'pages':>6s} {'old ms':>10s} {'new ms':>10s} {'ratio':>7s}")
+    for key in sorted(old.keys() & new.keys()):
+        a = old[key]["seconds_median"]
+        b = new[key]["seconds_median"]
+        ratio = b / a if a else float("inf")
+        flag = " !" if ratio > ns.threshold else ""
+        worse += bool(flag)
+        case, kind, pages = key
+        print(
+            f"{case:32s} {kind:9s} {pages:6d} {a * 1000:10.1f} {b * 1000:10.1f} {ratio:7.2f}{flag}"
+        )
+    return 1 if worse else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
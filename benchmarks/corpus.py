@@ -0,0 +1,114 @@
+import random
+from typing import Callable, Dict
+
+import pymupdf as fitz
+
+WORDS = (
+    "the of and to in is for that with as on by this be are from at an "
+    "which data model page result method figure table analysis value"
+).split()
+FORMULAS = [
+    "E = mc^2",
+    "∑_{i=1}^{n} x_i = μ n",
+    "∫_0^1 f(x) dx = F(1) − F(0)",
+    "σ^2 = E[(X − μ)^2]",
+    "α + β = γ",
+    "√(a^2 + b^2) = c",
+]
+
+
+def _pixmap(rng: random.Random, w: int, h: int) -> bytes:
+    # noisy tiles so the encoder cannot shrink them to nothing
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, w, h), False)
+    tile = 16
+    for y in range(0, h, tile):
+        for x in range(0, w, tile):
+            color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+            pix.set_rect(fitz.IRect(x, y, x + tile, y + tile), color)
+    return pix.tobytes("png")
+
+
+def _paragraph(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+
+def _text_page(page: fitz.Page, rng: random.Random) -> None:
+    rect = page.rect + (54, 54, -54, -54)
+    page.insert_textbox(rect, _paragraph(rng, 420), fontsize=10)
+
+
+def _image_page(page: fitz.Page, rng: random.Random) -> None:
+    page.insert_text((54, 54), _paragraph(rng, 12), fontsize=10)
+    page.insert_image(fitz.Rect(54, 80, 540, 560), stream=_pixmap(rng, 480, 480))
+
+
+def _repeated_page(
+    page: fitz.Page, rng: random.Random, logo: bytes
+) -> None:
+    page.insert_image(fitz.Rect(470, 20, 560, 70), stream=logo)
+    _text_page(page, rng)
+
+
+def _table_page(page: fitz.Page, rng: random.Random) -> None:
+    page.insert_text((54, 54), _paragraph(rng, 12), fontsize=10)
+    rows, cols = rng.randint(4, 12), rng.randint(3, 6)
+    x0, y0, cw, rh = 54, 80, 480 / cols, 18
+    for r in range(rows + 1):
+        page.draw_line((x0, y0 + r * rh), (x0 + cols * cw, y0 + r * rh))
+    for c in range(cols + 1):
+        page.draw_line((x0 + c * cw, y0), (x0 + c * cw, y0 + rows * rh))
+    for r in range(rows):
+        for c in range(cols):
+            cell = f"{rng.choice(WORDS)} {rng.randint(0, 999)}"
+            page.insert_text((x0 + c * cw + 3, y0 + r * rh + 13), cell, fontsize=8)
+    page.insert_textbox(
+        fitz.Rect(54, y0 + rows * rh + 20, 540, 780), _paragraph(rng, 150), fontsize=10
+    )
+
+
+def _formula_page(page: fitz.Page, rng: random.Random) -> None:
+    y = 60
+    while y < 780:
+        if rng.random() < 0.4:
+            line = rng.choice(FORMULAS)
+        else:
+            line = _paragraph(rng, 14)
+        page.insert_text((54, y), line, fontsize=10, fontname="helv")
+        y += 16
+
+
+KINDS = ("text", "images", "repeated", "tables", "formulas")
+
+
+def make_pdf(kind: str, pages: int, seed: int = 0) -> bytes:
+    rng = random.Random(f"{kind}:{pages}:{seed}")
+    doc = fitz.open()
+    logo = _pixmap(rng, 120, 60)
+    builders: Dict[str, Callable[[fitz.Page], None]] = {
+        "text": lambda p: _text_page(p, rng),
+        "images": lambda p: _image_page(p, rng),
+        "repeated": lambda p: _repeated_page(p, rng, logo),
+        "tables": lambda p: _table_page(p, rng),
+        "formulas": lambda p: _formula_page(p, rng),
+    }
+    build = builders[kind]
+    for _ in range(pages):
+        build(doc.new_page())
+    # fixed metadata and id so the same arguments give the same bytes
+    doc.set_metadata({})
+    data = doc.tobytes(garbage=3, deflate=True, no_new_id=True)
+    doc.close()
+    return data
+
+
+def make_mixed(pages: int, seed: int = 0) -> bytes:
+    # one document cycling through every kind, for the extraction paths
+    parts = [make_pdf(k, max(1, pages // len(KINDS)), seed) for k in KINDS]
+    out = fitz.open()
+    for part in parts:
+        with fitz.open(stream=part, filetype="pdf") as src:
+            out.insert_pdf(src)
+    out.set_metadata({})
+    data = out.tobytes(garbage=3, deflate=True, no_new_id=True)
+    out.close()
+    return data
@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+# cold thumbnail timings need a private cache that can be wiped freely;
+# main() removes it again unless the caller chose the directory
+_OWN_CACHE_DIR = "PDF_WORKBENCH_CACHE_DIR" not in os.environ
+if _OWN_CACHE_DIR:
+    os.environ["PDF_WORKBENCH_CACHE_DIR"] = tempfile.mkdtemp(prefix="pdfwb_bench_")
+
+import pymupdf as fitz  # noqa: E402
+
+from corpus import KINDS, make_mixed, make_pdf  # noqa: E402
+from pdf_workbench.basic_ops import (  # noqa: E402
+    filter_selected_per_file,
+    merge_in_order,
+    merge_selected,
+)
+from pdf_workbench.docpool import doc_pool  # noqa: E402
+from pdf_workbench.formulas import extract_formulas_batch  # noqa: E402
+from pdf_workbench.ingest import meta_cache, read_meta  # noqa: E402
+from pdf_workbench.pageorder import PageOrder  # noqa: E402
+from pdf_workbench.saving import linear_supported  # noqa: E402
+from pdf_workbench.search import search_cache, text_index  # noqa: E402
+from pdf_workbench.extract import (  # noqa: E402
+    build_extraction_zip,
+    extract_cache,
+    extract_pdf_content_to_memory,
+)
+from pdf_workbench.thumbs import ThumbParams, get_thumbnails, thumb_cache  # noqa: E402
+
+Case = Callable[[bytes, int], Callable[[], object]]
+
+
+def _reset() -> None:
+    doc_pool.clear()
+    thumb_cache.clear()
+    extract_cache.clear()
+    search_cache.clear()
+    meta_cache.clear()
+
+
+def _page_texts(data: bytes) -> List[str]:
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return [page.get_text() for page in doc]
+
+
+def _read_meta(data: bytes) -> object:
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return read_meta(doc, "bench", len(data))
+
+
+def _every_other(pages: int) -> List[int]:
+    return list(range(0, pages, 2))
+
+
+def _reordered(pages: int) -> List[Tuple[int, int]]:
+    # two documents, long runs in a shuffled block order, like a binder
+    half = max(1, pages // 2)
+    order = [(0, p) for p in range(half)] + [(1, p) for p in range(half)]
+    blocks = [order[i : i + 50] for i in range(0, len(order), 50)]
+    return [ref for block in reversed(blocks) for ref in block]
+
+
+CASES: Dict[str, Case] = {
+    "merge_selected": lambda data, n: lambda: merge_selected(
+        [("a", data), ("b", data)], {"a": _every_other(n), "b": []}
+    ),
+    "filter_selected_per_file": lambda data, n: lambda: (
+        filter_selected_per_file("a", data, _every_other(n))
+    ),
+    # the same every-other-page subset under each save profile; compare
+    # seconds and output_bytes across the three
+    "save_fast": lambda data, n: lambda: filter_selected_per_file(
+        "a", data, _every_other(n), "fast"
+    ),
+    "save_compact": lambda data, n: lambda: filter_selected_per_file(
+        "a", data, _every_other(n), "compact"
+    ),
+    "save_linear": lambda data, n: lambda: filter_selected_per_file(
+        "a", data, _every_other(n), "linear"
+    ),
+    # the organizer's _merge_in_order is a thin wrapper around this
+    "merge_in_order": lambda data, n: lambda: merge_in_order(
+        [data, data], _reordered(n)
+    ),
+    # the organizer's bulk operations on two n-page documents
+    "page_order_ops": lambda data, n: lambda: len(
+        PageOrder.from_counts([n, n])
+        .interleave()
+        .reverse(0, n)
+        .move(0, n // 2, n)
+        .drop_even()
+        .sort_by_doc()
+        .runs()
+    ),
+    "extract_pdf_content_to_memory": lambda data, n: lambda: (
+        extract_pdf_content_to_memory(data, "bench")
+    ),
+    "extract_text_profile": lambda data, n: lambda: (
+        extract_pdf_content_to_memory(data, "bench", profile="text")
+    ),
+    "build_extraction_zip": lambda data, n: lambda: build_extraction_zip(
+        [("bench.pdf", data)], workers=1
+    ),
+    "build_extraction_zip_parallel": lambda data, n: lambda: (
+        build_extraction_zip([("bench.pdf", data)])
+    ),
+    # text extraction happens outside the timed call
+    "formula_detection": lambda data, n: (
+        lambda texts: lambda: extract_formulas_batch(texts)
+    )(_page_texts(data)),
+    # the one background pass an upload gets (metadata and page text)
+    "ingest_meta": lambda data, n: lambda: _read_meta(data),
+    # building a page text index, then queries against a built one
+    "text_index": lambda data, n: lambda: text_index(data, cache=False),
+    "search_query": lambda data, n: (
+        lambda index: lambda: [
+            index.search(q)
+            for q in ("the", '"of the"', "data -the", "tab*", "zzz")
+        ]
+    )(text_index(data, cache=False)),
+    "thumbnails_selector": lambda data, n: lambda: get_thumbnails(
+        data, range(n), ThumbParams(zoom=1.5)
+    ),
+    "thumbnails_organizer": lambda data, n: lambda: get_thumbnails(
+        data, range(n), ThumbParams(zoom=1.1, max_w=200, gray=True)
+    ),
+    # the selector grid: a whole pyramid per page, the small level returned;
+    # output_bytes is the grid payload
+    "thumbnails_grid_png": lambda data, n: lambda: get_thumbnails(
+        data, range(n), ThumbParams(zoom=1.5), level="small"
+    ),
+    "thumbnails_grid_jpeg": lambda data, n: lambda: get_thumbnails(
+        data, range(n), ThumbParams(zoom=1.5, fmt="jpeg"), level="small"
+    ),
+    "thumbnails_grid_webp": lambda data, n: lambda: get_thumbnails(
+        data, range(n), ThumbParams(zoom=1.5, fmt="webp"), level="small"
+    ),
+}
+
+# without linearisation "linear" is just another compressed save; timing
+# it under that name would mislead
+if not linear_supported():
+    del CASES["save_linear"]
+
+
+def _output_bytes(result: object) -> int:
+    if isinstance(result, bytes):
+        return len(result)
+    if isinstance(result, dict):
+        return sum(len(v) for v in result.values())
+    if isinstance(result, list):
+        return sum(len(v) for v in result)
+    return 0
+
+
+def measure(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    # timings run without tracemalloc, which slows pure-Python code
+    # (pdfminer) several times over; one extra run records the heap peak.
+    # MuPDF's own C allocations are not visible to tracemalloc.
+    secs = []
+    for _ in range(repeat):
+        _reset()
+        t0 = time.perf_counter()
+        result = fn()
+        secs.append(time.perf_counter() - t0)
+    _reset()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds_min": min(secs),
+        "seconds_median": statistics.median(secs),
+        "py_peak_bytes": peak,
+        "output_bytes": _output_bytes(result),
+    }
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Time and memory-profile pdf_workbench on synthetic PDFs."
+    )
+    parser.add_argument("--sizes", default="10,100,500")
+    parser.add_argument("--kinds", default=",".join(KINDS + ("mixed",)))
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write JSON results here")
+    ns = parser.parse_args(argv)
+    unknown = [c for c in ns.cases.split(",") if c not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s) {unknown}; available: {sorted(CASES)}")
+    try:
+        _run(ns)
+    finally:
+        if _OWN_CACHE_DIR:
+            shutil.rmtree(os.environ["PDF_WORKBENCH_CACHE_DIR"], ignore_errors=True)
+    return 0
+
+
+def _run(ns: argparse.Namespace) -> None:
+    # pay the lazy imports up front instead of inside the first timed run
+    import pandas  # noqa: F401
+    import pdfplumber  # noqa: F401
+
+    results = []
+    for size in [int(s) for s in ns.sizes.split(",")]:
+        for kind in ns.kinds.split(","):
+            if kind == "mixed":
+                data = make_mixed(size, ns.seed)
+            else:
+                data = make_pdf(kind, size, ns.seed)
+            with fitz.open(stream=data, filetype="pdf") as doc:
+                pages = len(doc)
+            for case in ns.cases.split(","):
+                row = {
+                    "case": case,
+                    "kind": kind,
+                    "pages": pages,
+                    "input_bytes": len(data),
+                    **measure(CASES[case](data, pages), ns.repeat),
+                }
+                results.append(row)
+                print(
+                    f"{case:32s} {kind:9s} {pages:6d}p "
+                    f"{row['seconds_median'] * 1000:10.1f} ms "
+                    f"{row['py_peak_bytes'] / 1e6:8.1f} MB",
+                    file=sys.stderr,
+                )
+
+    report = {
+        "meta": {
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "pymupdf": fitz.VersionBind,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if ns.output:
+        Path(ns.output).write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Set
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import pdfplumber  # noqa: E402
+import pymupdf as fitz  # noqa: E402
+
+from corpus import KINDS, make_mixed, make_pdf  # noqa: E402
+from pdf_workbench.tables import TableScreen, is_table_candidate  # noqa: E402
+
+
+def pages_with_tables(data: bytes) -> Set[int]:
+    # ground truth: the full pdfplumber scan the prefilter stands in for
+    found: Set[int] = set()
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        for page in pdf.pages:
+            if page.extract_tables():
+                found.add(page.page_number - 1)
+            page.close()
+    return found
+
+
+def screened_pages(data: bytes, screen: TableScreen) -> Set[int]:
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return {p.number for p in doc if is_table_candidate(p, screen)}
+
+
+def check(name: str, data: bytes, screen: TableScreen) -> Dict[str, object]:
+    t0 = time.perf_counter()
+    truth = pages_with_tables(data)
+    t1 = time.perf_counter()
+    cand = screened_pages(data, screen)
+    t2 = time.perf_counter()
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        pages = len(doc)
+    missed = sorted(p + 1 for p in truth - cand)
+    return {
+        "name": name,
+        "pages": pages,
+        "table_pages": len(truth),
+        "candidates": len(cand),
+        "recall": len(truth & cand) / len(truth) if truth else 1.0,
+        "missed": missed,
+        "full_scan_s": t1 - t0,
+        "screen_s": t2 - t1,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Recall of the table prefilter against a full pdfplumber "
+        "scan; exits 1 if any table page would be skipped."
+    )
+    parser.add_argument("pdfs", nargs="*", help="extra PDFs to check")
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--min-edge-len", type=float, default=3.0)
+    parser.add_argument("--min-h-edges", type=int, default=2)
+    parser.add_argument("--min-v-edges", type=int, default=2)
+    parser.add_argument("--min-text-columns", type=int, default=0)
+    ns = parser.parse_args(argv)
+    screen = TableScreen(
+        min_edge_len=ns.min_edge_len,
+        min_h_edges=ns.min_h_edges,
+        min_v_edges=ns.min_v_edges,
+        min_text_columns=ns.min_text_columns,
+    )
+
+    inputs = [(k, make_pdf(k, ns.pages)) for k in KINDS]
+    inputs.append(("mixed", make_mixed(ns.pages)))
+    inputs.extend((p, Path(p).read_bytes()) for p in ns.pdfs)
+
+    failed: List[str] = []
+    for name, data in inputs:
+        row = check(name, data, screen)
+        print(
+            f"{row['name']:24s} {row['pages']:5d}p "
+            f"tables on {row['table_pages']:4d} "
+            f"candidates {row['candidates']:4d} "
+            f"recall {row['recall']:.3f} "
+            f"full {row['full_scan_s']:7.2f}s screen {row['screen_s']:6.3f}s"
+        )
+        if row["missed"]:
+            print(f"  missed pages: {row['missed']}")
+            failed.append(name)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
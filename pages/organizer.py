@@ -1,12 +1,31 @@
 from __future__ import annotations
 
+import time
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
-import pymupdf as fitz  # PyMuPDF
 import streamlit as st
 from streamlit_sortables import sort_items  # ohtaman API
 
+from src.pdf_workbench.basic_ops import merge_in_order
+from src.pdf_workbench.docstore import DocHandle
+from src.pdf_workbench.ingest import CONTENT_KINDS, doc_meta
+from src.pdf_workbench.pageorder import PageOrder
+from src.pdf_workbench.profiling import recording
+from src.pdf_workbench.saving import SAVE_PROFILES
+from src.pdf_workbench.search import search_pages
+from src.pdf_workbench.thumbs import ThumbParams, get_thumbnails, warm_thumbnails
+from src.pdf_workbench.ui import (
+    CONTENT_LABELS,
+    payload_caption,
+    save_profile_label,
+    session_doc_store,
+    session_jobs,
+    st_profiling_panel,
+    st_profiling_sidebar,
+    st_thumb_sidebar,
+)
+
 st.set_page_config(page_title="PDF Organizer", layout="wide")
 
 st.title("Organizer - reorderer")
@@ -16,87 +35,22 @@ st.caption(
 )
 
 
-@dataclass(frozen=True)
-class PageRef:
-    doc_idx: int
-    page_idx: int
-    label: str
-    uid: str
-
-
 @dataclass
 class DocBlob:
     name: str
-    data: bytes
+    handle: DocHandle
     pages: int
 
 
-@st.cache_data(show_spinner=False)
-def _read_doc(bytes_: bytes) -> int:
-    with fitz.open(stream=bytes_, filetype="pdf") as doc:
-        return len(doc)
+# above this many pages the drag lists are not rendered; the bulk
+# operations work at any size
+DRAG_LIMIT = 400
 
 
-@st.cache_data(show_spinner=False)
-def _make_thumb(
-    bytes_: bytes,
-    page_idx: int,
-    max_w: int = 200,
-    gray: bool = True,
-    scale_base: float = 1.1,
+def _merge_in_order(
+    docs: List[DocBlob], order: PageOrder, save_profile: str
 ) -> bytes:
-    with fitz.open(stream=bytes_, filetype="pdf") as doc:
-        page = doc[page_idx]
-        mat = fitz.Matrix(scale_base, scale_base)
-        if gray:
-            pix = page.get_pixmap(
-                matrix=mat, colorspace=fitz.csGRAY, alpha=False
-            )
-        else:
-            pix = page.get_pixmap(matrix=mat, alpha=False)
-        if pix.width > max_w:
-            scale = max_w / pix.width
-            mat2 = fitz.Matrix(scale, scale)
-            if gray:
-                pix = page.get_pixmap(
-                    matrix=mat * mat2, colorspace=fitz.csGRAY, alpha=False
-                )
-            else:
-                pix = page.get_pixmap(matrix=mat * mat2, alpha=False)
-        return pix.tobytes("png")
-
-
-def _build_page_refs(docs: List[DocBlob]) -> List[PageRef]:
-    refs: List[PageRef] = []
-    for di, d in enumerate(docs):
-        for pi in range(d.pages):
-            uid = f"{di}:{pi}"
-            refs.append(
-                PageRef(
-                    doc_idx=di,
-                    page_idx=pi,
-                    label=f"{d.name} • p{pi + 1}",
-                    uid=uid,
-                )
-            )
-    return refs
-
-
-def _merge_in_order(docs: List[DocBlob], order_uids: List[str]) -> bytes:
-    out = fitz.open()
-    opened: Dict[int, fitz.Document] = {}
-    try:
-        for uid in order_uids:
-            di, pi = map(int, uid.split(":"))
-            if di not in opened:
-                opened[di] = fitz.open(stream=docs[di].data, filetype="pdf")
-            out.insert_pdf(opened[di], from_page=pi, to_page=pi)
-        buf = out.tobytes()
-    finally:
-        out.close()
-        for d in opened.values():
-            d.close()
-    return buf
+    return merge_in_order([d.handle.source for d in docs], order, save_profile)
 
 
 st.sidebar.subheader("Upload (Organizer)")
@@ -118,21 +72,30 @@ max_thumbs = st.sidebar.number_input(
 window_start = st.sidebar.number_input(
     "Visible window start index", 0, 100000, 0, step=12
 )
+rec = st_profiling_sidebar()
+thumb_fmt, thumb_quality = st_thumb_sidebar("org_thumbs")
 
+store = session_doc_store()
 docs: List[DocBlob] = []
 
 preloaded = st.session_state.get("workbench_docs", [])
-for it in preloaded:
+for h in preloaded:
     try:
-        name, data = it["name"], it["data"]
-        docs.append(DocBlob(name=name, data=data, pages=_read_doc(data)))
+        docs.append(DocBlob(name=h.name, handle=h, pages=store.page_count(h)))
     except Exception:
         pass
 
-if org_files:
-    for f in org_files:
-        data = f.read()
-        docs.append(DocBlob(name=f.name, data=data, pages=_read_doc(data)))
+org_handles = store.add_many(
+    [(f.name, f, f.size, f.file_id) for f in org_files or []]
+)
+st.session_state["org_doc_keys"] = [h.key for h in org_handles]
+store.retain(
+    [h.key for h in preloaded]
+    + [h.key for h in org_handles]
+    + [k for j in session_jobs() if j.active for k in j.doc_keys]
+)
+for h in org_handles:
+    docs.append(DocBlob(name=h.name, handle=h, pages=store.page_count(h)))
 
 if not docs:
     st.info(
@@ -153,47 +116,141 @@ st.subheader(
     "Arrange: drag between lists to see merged preview. I am still working on making the thumbnails draggable."
 )
 
-page_refs = _build_page_refs(docs)
-uid_to_meta: Dict[str, PageRef] = {pr.uid: pr for pr in page_refs}
-
 
-def _initial_containers() -> List[Dict]:
+def _containers(order: PageOrder) -> List[Dict]:
+    # one drag list per run of a single document; the initial order gives
+    # one list per PDF
     containers: List[Dict] = []
-    for di, d in enumerate(docs):
-        items = [f"{di}:{pi} | {d.name} • p{pi + 1}" for pi in range(d.pages)]
-        containers.append({"header": f"{d.name}", "items": items})
+    last = None
+    for di, pi in order.window(0, len(order)):
+        name = docs[di].name
+        if di != last:
+            containers.append({"header": name, "items": []})
+            last = di
+        containers[-1]["items"].append(f"{di}:{pi} | {name} • p{pi + 1}")
     return containers
 
 
-if "org_containers" not in st.session_state:
-    st.session_state.org_containers = _initial_containers()
+def _set_order(order: PageOrder) -> None:
+    # a new sort_items key makes the drag lists start from this order
+    st.session_state.org_order = order
+    st.session_state.org_version = st.session_state.get("org_version", 0) + 1
+    st.session_state.pop("org_containers", None)
+
+
+doc_keys = [d.handle.key for d in docs]
+if st.session_state.get("org_order_docs") != doc_keys:
+    st.session_state.org_order_docs = doc_keys
+    _set_order(PageOrder.from_counts([d.pages for d in docs]))
+order: PageOrder = st.session_state.org_order
+
+with st.expander("Bulk operations", expanded=len(order) > DRAG_LIMIT):
+    n = max(1, len(order))
+    r1, r2, r3 = st.columns(3)
+    first = r1.number_input("From position", 1, n, 1, key="org_from")
+    last = r2.number_input("To position", 1, n, n, key="org_to")
+    dest = r3.number_input("Move to position", 1, n, 1, key="org_dest")
+    a, b = int(first) - 1, int(last)
+    new_order = None
+    ops = st.columns(4)
+    if ops[0].button("Move range", use_container_width=True):
+        new_order = order.move(a, b, int(dest) - 1)
+    if ops[1].button("Reverse range", use_container_width=True):
+        new_order = order.reverse(a, b)
+    if ops[2].button("Delete range", use_container_width=True):
+        new_order = order.delete(a, b)
+    if ops[3].button("Interleave documents", use_container_width=True):
+        new_order = order.interleave()
+    ops = st.columns(4)
+    if ops[0].button("Drop odd pages", use_container_width=True):
+        new_order = order.drop_odd()
+    if ops[1].button("Drop even pages", use_container_width=True):
+        new_order = order.drop_even()
+    if ops[2].button("Sort by document", use_container_width=True):
+        new_order = order.sort_by_doc()
+    if ops[3].button("Sort by page", use_container_width=True):
+        new_order = order.sort()
+    f1, f2 = st.columns([2, 1])
+    query = f1.text_input(
+        "Find pages",
+        key="org_query",
+        placeholder='words, "a phrase", -exclude, prefix*',
+    )
+    kind = f2.selectbox(
+        "Content",
+        (None,) + CONTENT_KINDS,
+        format_func=lambda k: "Any page" if k is None else CONTENT_LABELS[k],
+        key="org_content",
+    )
+    if query.strip() or kind:
+        hits: Dict[int, List[int]] = {}
+        with recording(rec):
+            for i, d in enumerate(docs):
+                pages = range(d.pages)
+                if query.strip():
+                    pages = search_pages(d.handle.source, query, d.handle.key)
+                if kind:
+                    meta = doc_meta(d.handle.source, d.handle.key)
+                    pages = sorted(set(pages) & set(meta.select(kind)))
+                hits[i] = list(pages)
+        mask = order.matching(hits)
+        st.caption(f"{int(mask.sum())} page(s) in the current order match.")
+        ops = st.columns(4)
+        if ops[0].button(
+            "Move matches to position",
+            use_container_width=True,
+            disabled=not mask.any(),
+        ):
+            new_order = order.gather(mask, int(dest) - 1)
+        if ops[1].button(
+            "Keep only matches",
+            use_container_width=True,
+            disabled=not mask.any(),
+        ):
+            new_order = order.keep(mask)
+        if ops[2].button(
+            "Delete matches", use_container_width=True, disabled=not mask.any()
+        ):
+            new_order = order.keep(~mask)
+    if new_order is not None:
+        _set_order(new_order)
+        st.rerun()
 
 left, right = st.columns([1, 2], gap="large")
 
 with left:
-    st.markdown("**Drag items across containers**")
-    sorted_containers = sort_items(
-        st.session_state.org_containers,
-        multi_containers=True,  # ← per ohtaman docs
-        custom_style="",  # you can theme this if you like
-        key="organizer_multi",
-    )
-    # Persist so the right preview/merge reflects current order
-    st.session_state.org_containers = sorted_containers
-
-# Flatten containers → ordered uids
-ordered_uids: List[str] = []
-for c in st.session_state.org_containers:
-    for s in c["items"]:
-        uid = s.split(" | ", 1)[0]
-        ordered_uids.append(uid)
+    if len(order) > DRAG_LIMIT:
+        st.caption(
+            f"{len(order)} pages: drag lists are off above {DRAG_LIMIT} "
+            "pages, use the bulk operations above."
+        )
+    else:
+        st.markdown("**Drag items across containers**")
+        if "org_containers" not in st.session_state:
+            st.session_state.org_containers = _containers(order)
+        sorted_containers = sort_items(
+            st.session_state.org_containers,
+            multi_containers=True,  # ← per ohtaman docs
+            custom_style="",  # you can theme this if you like
+            key=f"organizer_multi_{st.session_state.org_version}",
+        )
+        # only a drag changes the lists; parse them back into the order
+        if sorted_containers != st.session_state.org_containers:
+            st.session_state.org_containers = sorted_containers
+            order = PageOrder.from_pairs(
+                tuple(map(int, item.split(" | ", 1)[0].split(":")))
+                for c in sorted_containers
+                for item in c["items"]
+            )
+            st.session_state.org_order = order
 
 with right:
     st.markdown("**Merged order preview (thumbnails)**")
-    total = len(ordered_uids)
+    total = len(order)
     start = min(window_start, max(0, total - 1))
     end = min(start + int(max_thumbs), total)
     st.caption(f"Rendering thumbnails {start + 1}–{end} of {total}")
+    payload = st.empty()
 
     cols = st.slider("Preview columns", 2, 8, 5, key="preview_cols")
 
@@ -201,40 +258,82 @@ with right:
         for i in range(0, len(seq), n):
             yield seq[i : i + n]
 
-    visible = ordered_uids[start:end]
+    params = ThumbParams(
+        zoom=scale_base,
+        max_w=thumb_w,
+        gray=gray,
+        fmt=thumb_fmt,
+        quality=thumb_quality,
+    )
+    visible = order.window(start, end)
+
+    # one batch render per source document, then lay out in merged order
+    by_doc: Dict[int, List[int]] = {}
+    for di, pi in visible:
+        by_doc.setdefault(di, []).append(pi)
+    thumbs: Dict[Tuple[int, int], bytes] = {}
+    for di, pages in by_doc.items():
+        h = docs[di].handle
+        with recording(rec):
+            pngs = get_thumbnails(h.source, pages, params, h.key)
+        thumbs.update(((di, pi), png) for pi, png in zip(pages, pngs))
+
     for row in chunk(visible, cols):
         ccols = st.columns(len(row))
-        for j, uid in enumerate(row):
-            pr = uid_to_meta[uid]
-            png = _make_thumb(
-                docs[pr.doc_idx].data,
-                pr.page_idx,
-                max_w=thumb_w,
-                gray=gray,
-                scale_base=scale_base,
+        for j, (di, pi) in enumerate(row):
+            ccols[j].image(
+                thumbs[(di, pi)],
+                caption=f"{docs[di].name} • p{pi + 1}",
+                use_container_width=True,
             )
-            ccols[j].image(png, caption=pr.label, use_container_width=True)
+    payload.caption(payload_caption([thumbs[ref] for ref in visible], params))
+
+    # fill the disk cache for the next window while the user looks at this one
+    ahead: Dict[int, List[int]] = {}
+    for di, pi in order.window(end, end + int(max_thumbs)):
+        ahead.setdefault(di, []).append(pi)
+    for di, pages in ahead.items():
+        h = docs[di].handle
+        warm_thumbnails(h.source, pages, params, h.key)
 
 st.divider()
 
-ca, cb, _ = st.columns([1, 1, 5])
+ca, cb, cc, _ = st.columns([1, 1, 1, 4])
 with ca:
     if st.button("Reset lists", use_container_width=True):
-        st.session_state.org_containers = _initial_containers()
+        _set_order(PageOrder.from_counts([d.pages for d in docs]))
         st.rerun()
 
 with cb:
     build = st.button(
-        "Build & Download", type="primary", use_container_width=True
+        "Build & Download",
+        type="primary",
+        use_container_width=True,
+        key="org_build",
+    )
+
+with cc:
+    save_profile = st.selectbox(
+        "Save as",
+        list(SAVE_PROFILES),
+        format_func=save_profile_label,
+        key="org_save_profile",
+        label_visibility="collapsed",
     )
 
 if build:
-    if not ordered_uids:
+    if not len(order):
         st.error("No pages selected.")
         st.stop()
     with st.spinner("Assembling your PDF..."):
-        merged = _merge_in_order(docs, ordered_uids)
+        t0 = time.perf_counter()
+        with recording(rec):
+            merged = _merge_in_order(docs, order, save_profile)
+        elapsed = time.perf_counter() - t0
     st.success("Done! Download your organized PDF below.")
+    st.caption(
+        f"{len(merged) / 1e6:.2f} MB in {elapsed:.1f} s ({save_profile})"
+    )
     st.download_button(
         "Download organized.pdf",
         data=merged,
@@ -242,3 +341,5 @@ if build:
         mime="application/pdf",
         use_container_width=True,
     )
+
+st_profiling_panel(rec)
@@ -1,3 +1,146 @@
-from .basic_ops import *
-from .extract import *
-from .utils import *
+import importlib
+from typing import Any, List
+
+# Public names resolve on first access, so `import pdf_workbench` stays
+# cheap and never pulls in streamlit, pandas or pdfplumber. The Streamlit
+# widgets live in pdf_workbench.ui and are not re-exported here.
+_EXPORTS = {
+    "arrays": [
+        "ARRAY_DTYPES",
+        "ARRAY_FORMATS",
+        "decode_pixmap",
+        "pixmap_array",
+        "write_array_file",
+    ],
+    "basic_ops": [
+        "doc_page_runs",
+        "filter_selected_per_file",
+        "format_pages",
+        "insert_pages",
+        "is_identity",
+        "merge_in_order",
+        "merge_selected",
+        "page_runs",
+        "parse_pages",
+        "write_filtered",
+        "write_filtered_zip",
+        "write_in_order",
+        "write_merged",
+    ],
+    "cache": ["DiskCache", "cache_key", "cache_root"],
+    "docpool": [
+        "DocPool",
+        "Source",
+        "doc_pool",
+        "fingerprint",
+        "fingerprint_stream",
+        "open_source",
+        "page_count",
+        "source_bytes",
+        "source_key",
+        "source_path",
+        "source_size",
+    ],
+    "docstore": ["DocHandle", "DocumentStore"],
+    "extract": [
+        "ExtractProfile",
+        "PARTS",
+        "PROFILES",
+        "build_extraction_zip",
+        "build_extraction_zip_file",
+        "extract_cache",
+        "extract_pdf_content_to_memory",
+        "iter_pdf_artifacts",
+        "page_cache_key",
+        "page_ranges",
+        "resolve_profile",
+        "write_extraction_zip",
+    ],
+    "formulas": [
+        "FORMULA_MODES",
+        "detect_formulas",
+        "extract_formulas",
+        "extract_formulas_batch",
+        "formulas_from_page_dict",
+    ],
+    "ingest": [
+        "CONTENT_KINDS",
+        "DocMeta",
+        "MetaIndex",
+        "doc_meta",
+        "known_meta",
+        "meta_cache",
+        "meta_index",
+        "read_meta",
+    ],
+    "jobs": [
+        "Job",
+        "JobCancelled",
+        "JobRunner",
+        "advance",
+        "checkpoint",
+        "current_job",
+        "job_runner",
+    ],
+    "pageorder": ["PageOrder"],
+    "profiling": ["Recorder", "current_recorder", "recording", "stage"],
+    "saving": [
+        "DEFAULT_SAVE_PROFILE",
+        "SAVE_PROFILES",
+        "SaveProfile",
+        "linear_supported",
+        "resolve_save_profile",
+        "save_pdf",
+        "write_pdf",
+    ],
+    "search": [
+        "TextIndex",
+        "build_text_index",
+        "search_cache",
+        "search_documents",
+        "search_pages",
+        "text_index",
+    ],
+    "tables": [
+        "TableScreen",
+        "aligned_text_rows",
+        "is_table_candidate",
+        "ruling_edges",
+    ],
+    "thumbs": [
+        "PYRAMID",
+        "THUMB_FORMATS",
+        "ThumbParams",
+        "encode_levels",
+        "get_thumbnails",
+        "render_pages",
+        "render_pyramid",
+        "thumb_cache",
+        "thumb_formats",
+        "thumb_matrix",
+        "warm_thumbnails",
+    ],
+    "utils": [
+        "bytes_utf8",
+        "npy_bytes_from_array",
+        "render_thumbnails_png_bytes",
+        "sanitize",
+    ],
+}
+
+_WHERE = {name: mod for mod, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_WHERE)
+
+
+def __getattr__(name: str) -> Any:
+    mod = _WHERE.get(name)
+    if mod is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{mod}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,7 @@
+import sys
+
+from .cli import main
+
+# guarded so spawned extraction workers can re-import this module safely
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import math
+import os
+import tempfile
+from typing import TYPE_CHECKING
+
+import pymupdf as fitz
+
+if TYPE_CHECKING:
+    import numpy as np
+
+ARRAY_FORMATS = ("encoded", "npy", "npz")
+ARRAY_DTYPES = ("uint8", "float16", "float32")
+
+
+def decode_pixmap(doc: fitz.Document, xref: int, downscale: int = 1) -> fitz.Pixmap:
+    # gray or RGB samples without alpha, shrunk by a power-of-two factor
+    pix = fitz.Pixmap(doc, xref)
+    if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if downscale > 1:
+        pix.shrink(int(math.log2(downscale)))
+    return pix
+
+
+def pixmap_array(pix: fitz.Pixmap, dtype: str = "uint8") -> "np.ndarray":
+    # HxWxC view straight onto the pixmap's samples; only a dtype change
+    # copies. A uint8 view is valid only while `pix` is alive.
+    import numpy as np
+
+    h, w, n = pix.height, pix.width, pix.n
+    arr = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+    arr = arr.reshape(h, pix.stride)[:, : w * n].reshape(h, w, n)
+    if dtype != "uint8":
+        arr = arr.astype(dtype)
+        arr *= 1 / 255
+    return arr
+
+
+def write_array_file(arr: "np.ndarray", fmt: str = "npy") -> str:
+    # .npy goes through a memory-mapped file, so the samples are copied
+    # once, from the pixmap into the page cache; .npz is compressed
+    import numpy as np
+
+    fd, path = tempfile.mkstemp(prefix="pdfwb_arr_", suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        if fmt == "npz":
+            np.savez_compressed(path, pixels=arr)
+        else:
+            out = np.lib.format.open_memmap(
+                path, mode="w+", dtype=arr.dtype, shape=arr.shape
+            )
+            out[...] = arr
+            out.flush()
+            del out
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
@@ -1,38 +1,272 @@
 import io
-from typing import Dict, List, Tuple
+import os
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple, Union
 
 import pymupdf as fitz  # PyMuPDF
 
+from .docpool import Source, open_source, source_path, source_size
+from .jobs import advance
+from .profiling import stage
+from .saving import Dest, SaveProfile, resolve_save_profile, write_pdf
 
-def merge_selected(
-    pdfs: List[Tuple[str, bytes]], selections: Dict[str, List[int]]
-) -> bytes:
+if TYPE_CHECKING:
+    from .pageorder import PageOrder
+
+
+def parse_pages(spec: str) -> List[int]:
+    # "1-3,7,10" (1-based, inclusive) -> 0-based
+    pages: List[int] = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        if "-" in part:
+            a, b = (int(x) for x in part.split("-", 1))
+            if a < 1 or b < a:
+                raise ValueError(f"bad page range {part!r}")
+            pages.extend(range(a - 1, b))
+        else:
+            page = int(part)
+            if page < 1:
+                raise ValueError(f"bad page number {part!r}")
+            pages.append(page - 1)
+    return pages
+
+
+def format_pages(pages: Sequence[int]) -> str:
+    # the inverse for sorted pages: 0-based -> "1-3,7"
+    runs: List[List[int]] = []
+    for p in pages:
+        if runs and p == runs[-1][1] + 1:
+            runs[-1][1] = p
+        else:
+            runs.append([p, p])
+    return ",".join(
+        f"{a + 1}" if a == b else f"{a + 1}-{b + 1}" for a, b in runs
+    )
+
+
+def page_runs(pages: Sequence[int]) -> List[Tuple[int, int]]:
+    # (from_page, to_page) runs of consecutive pages; insert_pdf copies a
+    # run with from_page > to_page in reverse, so descending runs count too
+    runs: List[Tuple[int, int]] = []
+    for pno in pages:
+        if runs:
+            a, b = runs[-1]
+            if (a <= b and pno == b + 1) or (a >= b and pno == b - 1):
+                runs[-1] = (a, pno)
+                continue
+        runs.append((pno, pno))
+    return runs
+
+
+def doc_page_runs(
+    order: Sequence[Tuple[int, int]],
+) -> List[Tuple[int, int, int]]:
+    # (doc_idx, from_page, to_page) runs over an ordered (doc, page) list
+    runs: List[Tuple[int, int, int]] = []
+    start = 0
+    for i in range(1, len(order) + 1):
+        if i == len(order) or order[i][0] != order[start][0]:
+            di = order[start][0]
+            pages = [pi for _, pi in order[start:i]]
+            runs.extend((di, a, b) for a, b in page_runs(pages))
+            start = i
+    return runs
+
+
+def insert_pages(
+    out: fitz.Document, src: fitz.Document, pages: Sequence[int]
+) -> None:
+    # one insert_pdf per run; PyMuPDF keeps a graft map per source document,
+    # so shared resources are copied once while the source stays open
+    for a, b in page_runs(pages):
+        with stage("merge.insert", pages=abs(b - a) + 1):
+            out.insert_pdf(src, from_page=a, to_page=b)
+
+
+def is_identity(pages: Sequence[int], num_pages: int) -> bool:
+    # nothing selected, or every page once and in order
+    if not pages:
+        return True
+    return len(pages) == num_pages and all(
+        p == i for i, p in enumerate(pages)
+    )
+
+
+def _unchanged(
+    doc: fitz.Document, pages: Sequence[int], profile: SaveProfile
+) -> bool:
+    # a repaired file is rewritten, so the output is at least readable
+    return (
+        profile.passthrough
+        and not doc.is_repaired
+        and is_identity(pages, len(doc))
+    )
+
+
+def _passthrough(stage_name: str, label: str, data: Source, dest: Dest) -> int:
+    # the input file as it is; path to path is a plain file copy
+    with stage(stage_name, doc=label) as ev:
+        path = source_path(data)
+        if isinstance(dest, (str, Path)):
+            if path:
+                shutil.copyfile(path, dest)
+            else:
+                with open(dest, "wb") as fh:
+                    fh.write(data)
+        elif path:
+            with open(path, "rb") as fh:
+                shutil.copyfileobj(fh, dest, 1 << 20)
+        else:
+            dest.write(data)
+        ev["bytes"] = source_size(data)
+    return ev["bytes"]
+
+
+def write_merged(
+    pdfs: List[Tuple[str, Source]],
+    selections: Dict[str, List[int]],
+    dest: Dest,
+    save_profile: Union[None, str, SaveProfile] = None,
+) -> int:
+    profile = resolve_save_profile(save_profile)
     out = fitz.open()
     for label, data in pdfs:
-        with fitz.open(stream=data, filetype="pdf") as doc:
+        with stage("merge.open", doc=label):
+            doc = open_source(data)
+        with doc:
             sel = selections.get(label, [])
-            if not sel:
-                out.insert_pdf(doc)
+            if len(pdfs) == 1 and _unchanged(doc, sel, profile):
+                out.close()
+                advance(docs=1, pages=len(doc), message=label)
+                return _passthrough("merge.passthrough", label, data, dest)
+            if is_identity(sel, len(doc)):
+                # one bulk append for a whole file
+                with stage("merge.insert", doc=label, pages=len(doc)):
+                    out.insert_pdf(doc)
             else:
-                for pno in sel:
-                    out.insert_pdf(doc, from_page=pno, to_page=pno)
+                insert_pages(out, doc, sel)
+            advance(docs=1, pages=len(sel) or len(doc), message=label)
+    with out:
+        return write_pdf(out, dest, profile, "merge.save")
+
+
+def write_filtered(
+    label: str,
+    data: Source,
+    selected_pages: List[int],
+    dest: Dest,
+    save_profile: Union[None, str, SaveProfile] = None,
+) -> int:
+    profile = resolve_save_profile(save_profile)
+    with stage("filter.open", doc=label):
+        doc_in = open_source(data)
+    with doc_in:
+        num_pages = len(doc_in)
+        if _unchanged(doc_in, selected_pages, profile):
+            advance(pages=num_pages, message=label)
+            size = _passthrough("filter.passthrough", label, data, dest)
+        else:
+            # subset in place; every save profile collects garbage, which
+            # drops what the kept pages no longer reference. A whole file
+            # is saved as it is, without copying its pages first.
+            if not is_identity(selected_pages, num_pages):
+                with stage(
+                    "filter.select", doc=label, pages=len(selected_pages)
+                ):
+                    doc_in.select(list(selected_pages))
+            advance(pages=len(selected_pages) or num_pages, message=label)
+            size = write_pdf(doc_in, dest, profile, "filter.save", doc=label)
+    advance(docs=1)
+    return size
+
+
+def write_in_order(
+    sources: Sequence[Source],
+    order: Union[Sequence[Tuple[int, int]], "PageOrder"],
+    dest: Dest,
+    save_profile: Union[None, str, SaveProfile] = None,
+) -> int:
+    # a PageOrder finds its runs without materialising the pairs
+    runs = order.runs() if hasattr(order, "runs") else doc_page_runs(order)
+    profile = resolve_save_profile(save_profile)
+    if profile.passthrough and len(runs) == 1 and runs[0][1] == 0:
+        # all pages of one source, in order
+        di, _, last = runs[0]
+        with open_source(sources[di]) as doc:
+            unchanged = last == len(doc) - 1 and not doc.is_repaired
+        if unchanged:
+            return _passthrough(
+                "merge.passthrough", str(di), sources[di], dest
+            )
+    out = fitz.open()
+    opened: Dict[int, fitz.Document] = {}
+    try:
+        for di, a, b in runs:
+            if di not in opened:
+                with stage("merge.open", doc=str(di)):
+                    opened[di] = open_source(sources[di])
+            with stage("merge.insert", doc=str(di), pages=abs(b - a) + 1):
+                out.insert_pdf(opened[di], from_page=a, to_page=b)
+        return write_pdf(out, dest, profile, "merge.save")
+    finally:
+        out.close()
+        for d in opened.values():
+            d.close()
+
+
+def write_filtered_zip(
+    pdfs: List[Tuple[str, Source]],
+    selections: Dict[str, List[int]],
+    dest: Dest,
+    save_profile: Union[None, str, SaveProfile] = None,
+) -> None:
+    # MuPDF seeks while saving and ZIP entries cannot seek, so each PDF goes
+    # through a temp file; only one is on disk at a time
+    with zipfile.ZipFile(dest, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for label, data in pdfs:
+            fd, tmp = tempfile.mkstemp(prefix="pdfwb_", suffix=".pdf")
+            os.close(fd)
+            try:
+                write_filtered(
+                    label, data, selections.get(label, []), tmp, save_profile
+                )
+                zf.write(tmp, f"{Path(label).stem}_filtered.pdf")
+            finally:
+                os.unlink(tmp)
+
+
+# in-memory variants of the writers above
+
+
+def merge_selected(
+    pdfs: List[Tuple[str, Source]],
+    selections: Dict[str, List[int]],
+    save_profile: Union[None, str, SaveProfile] = None,
+) -> bytes:
     buf = io.BytesIO()
-    out.save(buf)
-    out.close()
+    write_merged(pdfs, selections, buf, save_profile)
     return buf.getvalue()
 
 
 def filter_selected_per_file(
-    label: str, data: bytes, selected_pages: List[int]
+    label: str,
+    data: Source,
+    selected_pages: List[int],
+    save_profile: Union[None, str, SaveProfile] = None,
+) -> bytes:
+    buf = io.BytesIO()
+    write_filtered(label, data, selected_pages, buf, save_profile)
+    return buf.getvalue()
+
+
+def merge_in_order(
+    sources: Sequence[Source],
+    order: Union[Sequence[Tuple[int, int]], "PageOrder"],
+    save_profile: Union[None, str, SaveProfile] = None,
 ) -> bytes:
-    with fitz.open(stream=data, filetype="pdf") as doc_in:
-        out = fitz.open()
-        if not selected_pages:
-            out.insert_pdf(doc_in)
-        else:
-            for pno in selected_pages:
-                out.insert_pdf(doc_in, from_page=pno, to_page=pno)
     buf = io.BytesIO()
-    out.save(buf)
-    out.close()
+    write_in_order(sources, order, buf, save_profile)
     return buf.getvalue()
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+
+def cache_root() -> Path:
+    env = os.environ.get("PDF_WORKBENCH_CACHE_DIR")
+    if env:
+        return Path(env)
+    return Path.home() / ".cache" / "pdf_workbench"
+
+
+def cache_key(*parts: object) -> str:
+    raw = "\x1f".join(str(p) for p in parts)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=20).hexdigest()
+
+
+class DiskCache:
+    # Content-addressed blobs on local disk, evicted least-recently-used
+    # first once the directory grows past max_bytes. Recency is the file
+    # mtime, so the order survives restarts.
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._index: "Optional[OrderedDict[str, int]]" = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        if self._index is None:
+            found = []
+            if self.root.exists():
+                for p in self.root.glob("*/*"):
+                    if p.name.startswith("."):
+                        continue
+                    try:
+                        st = p.stat()
+                    except OSError:
+                        continue
+                    found.append((st.st_mtime, p.name, st.st_size))
+            found.sort()
+            self._index = OrderedDict((k, size) for _, k, size in found)
+            self._bytes = sum(self._index.values())
+        return self._index
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            blob = path.read_bytes()
+        except OSError:
+            return None
+        with self._lock:
+            index = self._load_index()
+            if key in index:
+                index.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return blob
+
+    def get_path(self, key: str) -> Optional[Path]:
+        # like get(), for entries too big to read into memory
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        with self._lock:
+            index = self._load_index()
+            if key in index:
+                index.move_to_end(key)
+        return path
+
+    def __contains__(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def put(self, key: str, blob: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write-then-rename so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(prefix=".", dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(blob)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            index = self._load_index()
+            self._bytes -= index.pop(key, 0)
+            index[key] = len(blob)
+            self._bytes += len(blob)
+            self._evict()
+
+    def put_file(self, key: str, src: str) -> None:
+        # adds an existing file: hard-linked when on the same filesystem,
+        # copied otherwise; `src` itself is left alone
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".", dir=path.parent)
+        os.close(fd)
+        try:
+            os.unlink(tmp)
+            try:
+                os.link(src, tmp)
+            except OSError:
+                shutil.copyfile(src, tmp)
+            os.replace(tmp, path)
+            size = path.stat().st_size
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            index = self._load_index()
+            self._bytes -= index.pop(key, 0)
+            index[key] = size
+            self._bytes += size
+            self._evict()
+
+    def _evict(self) -> None:
+        index = self._load_index()
+        while self._bytes > self.max_bytes and index:
+            key, size = index.popitem(last=False)
+            self._bytes -= size
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def size(self) -> int:
+        with self._lock:
+            self._load_index()
+            return self._bytes
+
+    def clear(self) -> None:
+        with self._lock:
+            index = self._load_index()
+            for key in list(index):
+                try:
+                    self._path(key).unlink()
+                except OSError:
+                    pass
+            index.clear()
+            self._bytes = 0
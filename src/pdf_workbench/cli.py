@@ -0,0 +1,377 @@
+import argparse
+import sys
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .basic_ops import format_pages, parse_pages
+
+
+def _split_spec(arg: str) -> Tuple[str, Optional[str]]:
+    # "report.pdf:1-3,7" -> ("report.pdf", "1-3,7")
+    if ":" in arg and not Path(arg).exists():
+        path, spec = arg.rsplit(":", 1)
+        return path, spec
+    return arg, None
+
+
+def collect_inputs(args: Sequence[str]) -> List[Tuple[Path, Optional[str]]]:
+    found: List[Tuple[Path, Optional[str]]] = []
+    for arg in args:
+        path, spec = _split_spec(arg)
+        p = Path(path)
+        if p.is_dir():
+            found.extend((f, spec) for f in sorted(p.glob("*.pdf")))
+        elif p.exists():
+            found.append((p, spec))
+        else:
+            raise SystemExit(f"pdf-workbench: no such file or directory: {path}")
+    if not found:
+        raise SystemExit("pdf-workbench: no PDF inputs found")
+    return found
+
+
+def _output_stems(
+    inputs: Sequence[Tuple[Path, Optional[str]]],
+) -> List[str]:
+    # one name per input for files written side by side; stems that occur
+    # more than once (same file twice, or same name in two directories)
+    # get the input's position in front so outputs do not overwrite
+    stems = [p.stem for p, _ in inputs]
+    return [
+        f"{i + 1}_{stem}" if stems.count(stem) > 1 else stem
+        for i, stem in enumerate(stems)
+    ]
+
+
+def _pages(
+    p: Path, spec: Optional[str], ns: argparse.Namespace
+) -> List[int]:
+    # PAGES from the input or --pages, checked against the document
+    try:
+        pages = parse_pages(spec or getattr(ns, "pages", None) or "")
+    except ValueError as exc:
+        raise SystemExit(f"pdf-workbench: {p}: {exc}")
+    if pages:
+        from .docpool import page_count
+
+        num_pages = page_count(str(p))
+        bad = [i + 1 for i in pages if i >= num_pages]
+        if bad:
+            raise SystemExit(
+                f"pdf-workbench: {p}: no page {bad[0]} "
+                f"(the document has {num_pages})"
+            )
+    return pages
+
+
+def _selection(
+    p: Path, spec: Optional[str], ns: argparse.Namespace
+) -> List[int]:
+    # the input's pages, narrowed to the pages that match --match; an
+    # empty list means every page, or no match at all
+    pages = _pages(p, spec, ns)
+    if not ns.match:
+        return pages
+    from .search import search_pages
+
+    hits = search_pages(str(p), ns.match)
+    if not pages:
+        return hits
+    keep = set(hits)
+    return [i for i in pages if i in keep]
+
+
+def _cmd_merge(ns: argparse.Namespace) -> int:
+    from .basic_ops import write_merged
+
+    pdfs: List[Tuple[str, str]] = []
+    selections: Dict[str, List[int]] = {}
+    for i, (p, spec) in enumerate(collect_inputs(ns.inputs)):
+        sel = _selection(p, spec, ns)
+        if ns.match and not sel:
+            continue
+        # the same file may be listed twice with different pages
+        label = f"{i}:{p}"
+        pdfs.append((label, str(p)))
+        selections[label] = sel
+    if not pdfs:
+        raise SystemExit(f"pdf-workbench: no page matches {ns.match!r}")
+    write_merged(pdfs, selections, ns.output, ns.save)
+    print(ns.output)
+    return 0
+
+
+def _cmd_filter(ns: argparse.Namespace) -> int:
+    from .basic_ops import write_filtered
+
+    out_dir = Path(ns.output)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    inputs = collect_inputs(ns.inputs)
+    for (p, spec), stem in zip(inputs, _output_stems(inputs)):
+        sel = _selection(p, spec, ns)
+        if ns.match and not sel:
+            continue
+        dest = out_dir / f"{stem}_filtered.pdf"
+        write_filtered(p.name, str(p), sel, dest, ns.save)
+        print(dest)
+    return 0
+
+
+def _cmd_extract(ns: argparse.Namespace) -> int:
+    from .extract import ExtractProfile, resolve_profile, write_extraction_zip
+
+    try:
+        if ns.parts:
+            profile = ExtractProfile.from_parts(ns.parts.split(","))
+        else:
+            profile = resolve_profile(ns.profile)
+    except ValueError as exc:
+        raise SystemExit(f"pdf-workbench: {exc}")
+    if ns.scan_all_tables:
+        profile = replace(profile, table_screen=None)
+    try:
+        profile = replace(
+            profile,
+            formula_mode=ns.formulas,
+            array_format=ns.arrays,
+            array_dtype=ns.array_dtype,
+            array_downscale=ns.array_downscale,
+        )
+    except ValueError as exc:
+        raise SystemExit(f"pdf-workbench: {exc}")
+    inputs = collect_inputs(ns.inputs)
+    for p, spec in inputs:
+        if spec:
+            raise SystemExit(
+                f"pdf-workbench: extract works on whole documents; "
+                f"drop :{spec} from {p}"
+            )
+    # opened by path: neither this process nor the workers load whole files
+    items = ((p.name, str(p)) for p, _ in inputs)
+    with open(ns.output, "wb") as fh:
+        write_extraction_zip(
+            items,
+            fh,
+            workers=ns.workers,
+            dedupe_images=ns.dedupe_images,
+            profile=profile,
+            cache=not ns.no_cache,
+        )
+    print(ns.output)
+    return 0
+
+
+def _cmd_search(ns: argparse.Namespace) -> int:
+    from .search import search_pages
+
+    found = 0
+    for p, spec in collect_inputs(ns.inputs):
+        hits = search_pages(str(p), ns.query, cache=not ns.no_cache)
+        if spec:
+            keep = set(_pages(p, spec, ns))
+            hits = [i for i in hits if i in keep]
+        if hits:
+            found += 1
+            # pastes straight back as an input: merge "a.pdf:3-5,9"
+            print(f"{p}:{format_pages(hits)}")
+    return 0 if found else 1
+
+
+def _cmd_thumbnails(ns: argparse.Namespace) -> int:
+    from .docpool import page_count
+    from .thumbs import ThumbParams, get_thumbnails
+
+    out_dir = Path(ns.output)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        params = ThumbParams(
+            zoom=ns.zoom,
+            max_w=ns.width,
+            gray=ns.gray,
+            fmt=ns.format,
+            quality=ns.quality,
+        )
+    except ValueError as exc:
+        raise SystemExit(f"pdf-workbench: {exc}")
+    inputs = collect_inputs(ns.inputs)
+    for (p, spec), stem in zip(inputs, _output_stems(inputs)):
+        src = str(p)
+        pages = _pages(p, spec, ns) or range(page_count(src))
+        thumbs = get_thumbnails(src, pages, params, level=ns.level)
+        for pno, img in zip(pages, thumbs):
+            dest = out_dir / f"{stem}_page_{pno + 1}{params.suffix}"
+            dest.write_bytes(img)
+            print(dest)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="pdf-workbench",
+        description="Merge, filter, extract and preview PDFs without the UI.",
+    )
+    parser.add_argument(
+        "--timings", metavar="FILE", help="write per-stage timings as JSON"
+    )
+    parser.add_argument(
+        "--cprofile", metavar="FILE", help="write a cProfile dump (.prof)"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    inputs_help = (
+        "PDF files or directories; append :PAGES to a file "
+        "(e.g. report.pdf:1-3,7) to pick pages from it"
+    )
+    save_opts = dict(
+        default=None,
+        choices=["fast", "compact", "linear"],
+        help="save profile: fast (no compression), compact (smallest) or "
+        "linear (linearized for the web; where MuPDF cannot linearize, "
+        "compressed without object streams); default fast, or "
+        "$PDF_WORKBENCH_SAVE_PROFILE",
+    )
+
+    match_opts = dict(
+        metavar="QUERY",
+        help='keep only pages whose text matches QUERY (words, "a phrase", '
+        "-exclude, prefix*); inputs without a match are skipped",
+    )
+
+    p = sub.add_parser("merge", help="merge selected pages into one PDF")
+    p.add_argument("inputs", nargs="+", help=inputs_help)
+    p.add_argument("-o", "--output", default="merged.pdf")
+    p.add_argument("--pages", help="page selection applied to every input")
+    p.add_argument("--match", **match_opts)
+    p.add_argument("--save", **save_opts)
+    p.set_defaults(func=_cmd_merge)
+
+    p = sub.add_parser("filter", help="write one filtered PDF per input")
+    p.add_argument("inputs", nargs="+", help=inputs_help)
+    p.add_argument("-o", "--output", default=".", help="output directory")
+    p.add_argument("--pages", help="page selection applied to every input")
+    p.add_argument("--match", **match_opts)
+    p.add_argument("--save", **save_opts)
+    p.set_defaults(func=_cmd_filter)
+
+    p = sub.add_parser("extract", help="extract text, images and tables")
+    p.add_argument(
+        "inputs", nargs="+", help="PDF files or directories (whole documents)"
+    )
+    p.add_argument("-o", "--output", default="extracted_contents.zip")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--dedupe-images", action="store_true")
+    p.add_argument(
+        "--profile",
+        default="full",
+        choices=["full", "text", "tables", "images"],
+        help="which outputs to produce (default: full)",
+    )
+    p.add_argument(
+        "--parts",
+        help="custom comma-separated outputs, overriding --profile: "
+        "text,markdown,combined,formulas,images,arrays,tables",
+    )
+    p.add_argument(
+        "--formulas",
+        default="text",
+        choices=["text", "strict", "layout"],
+        help="formula detection: any line with a math symbol (text), "
+        "without prose lines (strict), or using span fonts (layout)",
+    )
+    p.add_argument(
+        "--arrays",
+        default="encoded",
+        choices=["encoded", "npy", "npz"],
+        help="image arrays: encoded image bytes (legacy), or decoded "
+        "HxWxC pixels as .npy or compressed .npz",
+    )
+    p.add_argument(
+        "--array-dtype",
+        default="uint8",
+        choices=["uint8", "float16", "float32"],
+        help="pixel dtype; floats are scaled to 0..1",
+    )
+    p.add_argument(
+        "--array-downscale",
+        type=int,
+        default=1,
+        help="shrink decoded pixels by this power of two",
+    )
+    p.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="ignore and do not fill the per-page extraction cache",
+    )
+    p.add_argument(
+        "--scan-all-tables",
+        action="store_true",
+        help="run table detection on every page, not only on pages with "
+        "ruling lines",
+    )
+    p.set_defaults(func=_cmd_extract)
+
+    p = sub.add_parser(
+        "search", help="list the pages whose text matches a query"
+    )
+    p.add_argument(
+        "query", help='words, "a phrase", -exclude and prefix* terms'
+    )
+    p.add_argument(
+        "inputs",
+        nargs="+",
+        help="PDF files or directories; append :PAGES to a file "
+        "(e.g. report.pdf:1-3,7) to search only those pages",
+    )
+    p.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="rebuild the text index instead of using the cached one",
+    )
+    p.set_defaults(func=_cmd_search)
+
+    p = sub.add_parser("thumbnails", help="render page thumbnails")
+    p.add_argument("inputs", nargs="+", help=inputs_help)
+    p.add_argument("-o", "--output", default="thumbnails")
+    p.add_argument("--pages", help="page selection applied to every input")
+    p.add_argument("--zoom", type=float, default=1.5)
+    p.add_argument("--width", type=int, default=None, help="max width in px")
+    p.add_argument("--gray", action="store_true")
+    p.add_argument(
+        "--format",
+        default="png",
+        choices=["png", "jpeg", "webp"],
+        help="image encoding; webp needs Pillow",
+    )
+    p.add_argument(
+        "--quality", type=int, default=75, help="jpeg/webp quality, 1-100"
+    )
+    p.add_argument(
+        "--level",
+        default="large",
+        choices=["large", "medium", "small"],
+        help="preview level: the render at --zoom, or 1/2 or 1/3 of it",
+    )
+    p.set_defaults(func=_cmd_thumbnails)
+
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ns = build_parser().parse_args(argv)
+    if not (ns.timings or ns.cprofile):
+        return ns.func(ns)
+
+    from .profiling import Recorder, recording
+
+    rec = Recorder(profile=bool(ns.cprofile))
+    with recording(rec):
+        rc = ns.func(ns)
+    if ns.timings:
+        Path(ns.timings).write_text(rec.to_json())
+    if ns.cprofile:
+        Path(ns.cprofile).write_bytes(rec.profile_stats())
+    return rc
+
+
+if __name__ == "__main__":
+    sys.exit(main())
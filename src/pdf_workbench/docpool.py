@@ -0,0 +1,164 @@
+import hashlib
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Union
+
+import pymupdf as fitz
+
+# in-memory PDF bytes, the path of a PDF on local disk, or a read-only
+# mmap of one. Paths are opened by name, so MuPDF reads pages on demand
+# and never holds the whole file.
+Source = Union[bytes, str, Path, mmap.mmap]
+
+
+def fingerprint(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def fingerprint_stream(fh: BinaryIO, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: fh.read(chunk_size), b""):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def source_key(src: Source) -> str:
+    if isinstance(src, (str, Path)):
+        with open(src, "rb") as fh:
+            return fingerprint_stream(fh)
+    return fingerprint(src)
+
+
+def source_size(src: Source) -> int:
+    if isinstance(src, (str, Path)):
+        return os.path.getsize(src)
+    return len(src)
+
+
+def source_bytes(src: Source) -> bytes:
+    if isinstance(src, (str, Path)):
+        with open(src, "rb") as fh:
+            return fh.read()
+    return bytes(src)
+
+
+def source_path(src: Source) -> Optional[str]:
+    return str(src) if isinstance(src, (str, Path)) else None
+
+
+def open_source(src: Source) -> fitz.Document:
+    if isinstance(src, (str, Path)):
+        return fitz.open(str(src), filetype="pdf")
+    if isinstance(src, mmap.mmap):
+        # PyMuPDF takes a memoryview of the mapping without copying it
+        return fitz.open(stream=memoryview(src), filetype="pdf")
+    return fitz.open(stream=src, filetype="pdf")
+
+
+class _Entry:
+    def __init__(self, doc: fitz.Document, size: int):
+        self.doc = doc
+        self.size = size
+        self.lock = threading.Lock()
+        self.users = 0
+
+
+class DocPool:
+    # Keeps parsed fitz.Document handles alive so repeated renders and page
+    # counts do not re-parse the xref table. Handles are not thread-safe, so
+    # a checkout holds the entry lock for its whole duration.
+
+    def __init__(self, max_docs: int = 16, max_bytes: int = 1 << 30):
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self, key: str, src: Source) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.users += 1
+                return entry
+
+        # parse outside the pool lock so other documents are not blocked
+        doc = open_source(src)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                doc.close()
+            else:
+                entry = _Entry(doc, source_size(src))
+                self._entries[key] = entry
+                self._bytes += entry.size
+            entry.users += 1
+            self._evict()
+            return entry
+
+    def _release(self, key: str, entry: _Entry) -> None:
+        with self._lock:
+            entry.users -= 1
+            if self._entries.get(key) is not entry and entry.users == 0:
+                entry.doc.close()
+            self._evict()
+
+    def _evict(self) -> None:
+        # oldest first, skipping handles that are checked out right now
+        for key in list(self._entries):
+            if (
+                len(self._entries) <= self.max_docs
+                and self._bytes <= self.max_bytes
+            ):
+                break
+            entry = self._entries[key]
+            if entry.users:
+                continue
+            del self._entries[key]
+            self._bytes -= entry.size
+            entry.doc.close()
+
+    @contextmanager
+    def checkout(
+        self, src: Source, key: Optional[str] = None
+    ) -> Iterator[fitz.Document]:
+        key = key or source_key(src)
+        entry = self._acquire(key, src)
+        try:
+            with entry.lock:
+                yield entry.doc
+        finally:
+            self._release(key, entry)
+
+    def page_count(self, src: Source, key: Optional[str] = None) -> int:
+        with self.checkout(src, key) as doc:
+            return len(doc)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            self._bytes -= entry.size
+            if not entry.users:
+                entry.doc.close()
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                entry = self._entries.pop(key)
+                self._bytes -= entry.size
+                if not entry.users:
+                    entry.doc.close()
+
+
+doc_pool = DocPool()
+
+
+def page_count(src: Source, key: Optional[str] = None) -> int:
+    return doc_pool.page_count(src, key)
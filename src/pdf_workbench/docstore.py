@@ -0,0 +1,253 @@
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .docpool import Source, doc_pool, fingerprint, fingerprint_stream
+from .ingest import INGEST_WORKERS, meta_index
+
+SESSION_BUDGET_MB = int(os.environ.get("PDF_WORKBENCH_SESSION_MB", "256"))
+SPILL_MB = int(os.environ.get("PDF_WORKBENCH_SPILL_MB", "32"))
+
+
+@dataclass(frozen=True)
+class DocHandle:
+    key: str
+    name: str
+    size: int
+    data: Optional[bytes] = field(default=None, repr=False)
+    path: Optional[str] = None
+
+    @property
+    def source(self) -> Source:
+        return self.data if self.data is not None else self.path  # type: ignore[return-value]
+
+    def read_bytes(self) -> bytes:
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as fh:  # type: ignore[arg-type]
+            return fh.read()
+
+
+class DocumentStore:
+    # One copy per distinct upload, addressed by content fingerprint. Files
+    # above spill_bytes, or that would push the in-memory total past
+    # budget_bytes, are kept in a temp file instead and opened by path.
+    # Background jobs lease the keys they read, so dropping a document
+    # while a job still has its spill file open defers the unlink until
+    # the lease is released.
+
+    def __init__(
+        self,
+        budget_bytes: int = SESSION_BUDGET_MB << 20,
+        spill_bytes: int = SPILL_MB << 20,
+        spill_dir: Optional[str] = None,
+    ):
+        self.budget_bytes = budget_bytes
+        self.spill_bytes = spill_bytes
+        self.spill_dir = spill_dir
+        self._docs: Dict[str, DocHandle] = {}
+        self._uploads: Dict[str, str] = {}
+        self._pages: Dict[str, int] = {}
+        self._leases: Dict[str, int] = {}
+        # spill files of dropped documents that are still leased
+        self._orphans: Dict[str, List[str]] = {}
+        # in-memory bytes promised to adds still hashing
+        self._reserved = 0
+        self._lock = threading.Lock()
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(h.size for h in self._docs.values() if h.data is not None)
+
+    def _spill(self, fh: BinaryIO) -> str:
+        fd, path = tempfile.mkstemp(
+            prefix="pdfwb_", suffix=".pdf", dir=self.spill_dir
+        )
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(fh, out, 1 << 20)
+        return path
+
+    def add(
+        self,
+        name: str,
+        fh: BinaryIO,
+        size: int,
+        upload_id: Optional[str] = None,
+    ) -> DocHandle:
+        # hashing and spilling run outside the lock, so add_many() reads
+        # several uploads at once
+        with self._lock:
+            # reruns hand us the same upload again; skip re-hashing it
+            key = self._uploads.get(upload_id) if upload_id else None
+            if key and key in self._docs:
+                return self._named(self._docs[key], name)
+            spill = size > self.spill_bytes or (
+                self.memory_bytes + self._reserved + size > self.budget_bytes
+            )
+            if not spill:
+                self._reserved += size
+
+        try:
+            fh.seek(0)
+            if spill:
+                path = self._spill(fh)
+                with open(path, "rb") as src:
+                    key = fingerprint_stream(src)
+                handle = DocHandle(key, name, size, path=path)
+            else:
+                data = fh.read()
+                key = fingerprint(data)
+                handle = DocHandle(key, name, size, data=data)
+        except BaseException:
+            if not spill:
+                with self._lock:
+                    self._reserved -= size
+            raise
+
+        with self._lock:
+            if not spill:
+                self._reserved -= size
+            if key in self._docs:
+                if spill:
+                    os.unlink(handle.path)  # type: ignore[arg-type]
+            else:
+                self._docs[key] = handle
+            if upload_id:
+                self._uploads[upload_id] = key
+            return self._named(self._docs[key], name)
+
+    def add_many(
+        self, uploads: Sequence[Tuple[str, BinaryIO, int, Optional[str]]]
+    ) -> List[DocHandle]:
+        # (name, file, size, upload_id) per upload. New uploads are hashed
+        # and counted on a thread pool; per-page metadata then continues in
+        # the background on meta_index.
+        with self._lock:
+            known = {u for u, k in self._uploads.items() if k in self._docs}
+        todo = [i for i, u in enumerate(uploads) if u[3] not in known]
+        fresh: Dict[int, DocHandle] = {}
+        if len(todo) > 1:
+            workers = min(len(todo), INGEST_WORKERS)
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                added = ex.map(lambda i: self.add(*uploads[i]), todo)
+                fresh = dict(zip(todo, added))
+                list(ex.map(self.page_count, fresh.values()))
+        else:
+            fresh = {i: self.add(*uploads[i]) for i in todo}
+        for h in fresh.values():
+            meta_index.submit(h.source, h.key)
+        return [
+            fresh[i] if i in fresh else self.add(*u)
+            for i, u in enumerate(uploads)
+        ]
+
+    def add_bytes(self, name: str, data: bytes) -> DocHandle:
+        key = fingerprint(data)
+        with self._lock:
+            if key not in self._docs:
+                self._docs[key] = DocHandle(key, name, len(data), data=data)
+            return self._named(self._docs[key], name)
+
+    @staticmethod
+    def _named(handle: DocHandle, name: str) -> DocHandle:
+        if handle.name == name:
+            return handle
+        return DocHandle(
+            handle.key, name, handle.size, data=handle.data, path=handle.path
+        )
+
+    def get(self, key: str) -> Optional[DocHandle]:
+        return self._docs.get(key)
+
+    def page_count(self, handle: DocHandle) -> int:
+        pages = self._pages.get(handle.key)
+        if pages is None:
+            # ingested before (in any session) means no need to open it
+            meta = meta_index.get(handle.key)
+            if meta is not None:
+                pages = meta.pages
+            else:
+                pages = doc_pool.page_count(handle.source, handle.key)
+            self._pages[handle.key] = pages
+        return pages
+
+    def handles(self) -> List[DocHandle]:
+        return list(self._docs.values())
+
+    def retain(self, keys: Iterable[str]) -> None:
+        live = set(keys)
+        with self._lock:
+            for key in [k for k in self._docs if k not in live]:
+                self._drop(key)
+            self._uploads = {
+                u: k for u, k in self._uploads.items() if k in self._docs
+            }
+
+    def lease(self, keys: Iterable[str]) -> Callable[[], None]:
+        # keeps the documents' spill files on disk until the returned
+        # callable is called, even if retain() or close() drops them
+        leased = list(keys)
+        with self._lock:
+            for key in leased:
+                self._leases[key] = self._leases.get(key, 0) + 1
+        released = threading.Event()
+
+        def release() -> None:
+            if released.is_set():
+                return
+            released.set()
+            with self._lock:
+                for key in leased:
+                    count = self._leases.pop(key) - 1
+                    if count:
+                        self._leases[key] = count
+                    else:
+                        for path in self._orphans.pop(key, ()):
+                            _unlink(path)
+
+        return release
+
+    def _drop(self, key: str) -> None:
+        handle = self._docs.pop(key)
+        self._pages.pop(key, None)
+        doc_pool.discard(key)
+        meta_index.discard(key)
+        if handle.path:
+            if key in self._leases:
+                self._orphans.setdefault(key, []).append(handle.path)
+            else:
+                _unlink(handle.path)
+
+    def close(self) -> None:
+        with self._lock:
+            for key in list(self._docs):
+                self._drop(key)
+            self._uploads.clear()
+
+    def __del__(self) -> None:
+        # a pending lease holds a reference to the store, so only files no
+        # job is reading are left by the time this runs
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
@@ -1,121 +1,1049 @@
+import hashlib
 import io
+import itertools
+import json
+import math
+import mmap
+import multiprocessing as mp
+import os
+import pickle
+import shutil
+import tempfile
+import threading
 import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import (
+    BinaryIO,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
-import numpy as np
-import pandas as pd
-import pdfplumber
 import pymupdf as fitz
 
+from .arrays import (
+    ARRAY_DTYPES,
+    ARRAY_FORMATS,
+    decode_pixmap,
+    pixmap_array,
+    write_array_file,
+)
+from .cache import DiskCache, cache_key, cache_root
+from .docpool import Source, open_source, source_key
+from .formulas import FORMULA_MODES, detect_formulas
+from .ingest import META_SCREEN, DocMeta, known_meta
+from .jobs import advance, wait
+from .profiling import Recorder, current_recorder, recording, stage
+from .tables import TableScreen, is_table_candidate
 from .utils import *
 
 
-def extract_pdf_content_to_memory(
-    pdf_bytes: bytes, paper_name: str
-) -> Dict[str, bytes]:
-    files: Dict[str, bytes] = {}
+# each worker is a spawned interpreter with its own MuPDF; past a few of
+# them the default mostly buys memory use, not speed
+MAX_DEFAULT_WORKERS = 4
+WORKERS = int(os.environ.get("PDF_WORKBENCH_WORKERS", "0")) or min(
+    MAX_DEFAULT_WORKERS, os.cpu_count() or 1
+)
+MIN_PAGES_PER_TASK = 8
+MAX_PAGES_PER_TASK = 32
+# documents this short are extracted in-process, not sent to workers
+SERIAL_PAGES = 2 * MIN_PAGES_PER_TASK
+SPOOL_BYTES = 32 << 20
+
+# bump whenever the per-page outputs change, so cached pages are not reused
+EXTRACTOR_VERSION = 1
+EXTRACT_CACHE_MB = int(os.environ.get("PDF_WORKBENCH_EXTRACT_CACHE_MB", "1024"))
+extract_cache = DiskCache(cache_root() / "extract", EXTRACT_CACHE_MB << 20)
+
+
+
+class _SpillFile:
+    # A payload already written to a file on disk, such as a decoded pixel
+    # array. Only the path travels between processes; `owned` files are
+    # temporary and deleted once consumed, cache files are left alone.
+
+    def __init__(self, path: str, owned: bool = True):
+        self.path = path
+        self.owned = owned
+
+    def release(self) -> None:
+        if self.owned:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+# (archive path, payload); payloads too big to hold are spooled file objects
+# or files on disk
+Artifact = Tuple[str, Union[bytes, BinaryIO, _SpillFile]]
+
+
+def _release(blob) -> None:
+    if isinstance(blob, _SpillFile):
+        blob.release()
+
+
+@dataclass(frozen=True)
+class ExtractProfile:
+    # Which outputs to produce. Passes whose outputs are all off are not
+    # run at all: no get_text() without text outputs, no image decoding
+    # without images, and pdfplumber is never opened without tables.
+    text: bool = True  # per-page .txt
+    markdown: bool = True  # per-page .md
+    combined: bool = True  # combined_text/*.txt and *.md
+    formulas: bool = True
+    images: bool = True
+    arrays: bool = True  # .npy next to each image
+    # "encoded" keeps the legacy .npy of the compressed image bytes; "npy"
+    # and "npz" hold decoded HxWxC pixels in array_dtype, shrunk by
+    # array_downscale (a power of two)
+    array_format: str = "encoded"
+    array_dtype: str = "uint8"
+    array_downscale: int = 1
+    tables: bool = True
+    # pages failing the screen skip pdfplumber; None scans every page
+    table_screen: Optional[TableScreen] = TableScreen()
+    # "text" keeps every line with a math symbol, "strict" drops lines that
+    # read like prose, "layout" also uses span fonts and sizes
+    formula_mode: str = "text"
+
+    def __post_init__(self):
+        if self.formula_mode not in FORMULA_MODES:
+            raise ValueError(
+                f"unknown formula mode {self.formula_mode!r}; "
+                f"expected one of {FORMULA_MODES}"
+            )
+        if self.array_format not in ARRAY_FORMATS:
+            raise ValueError(
+                f"unknown array format {self.array_format!r}; "
+                f"expected one of {ARRAY_FORMATS}"
+            )
+        if self.array_dtype not in ARRAY_DTYPES:
+            raise ValueError(
+                f"unsupported array dtype {self.array_dtype!r}; "
+                f"expected one of {ARRAY_DTYPES}"
+            )
+        n = self.array_downscale
+        if n < 1 or n & (n - 1):
+            raise ValueError(
+                f"array_downscale must be a power of two, got {n}"
+            )
+
+    @classmethod
+    def from_parts(cls, parts: Iterable[str]) -> "ExtractProfile":
+        wanted = set(parts)
+        unknown = wanted - set(PARTS)
+        if unknown:
+            raise ValueError(f"unknown extraction part(s): {sorted(unknown)}")
+        return cls(**{name: name in wanted for name in PARTS})
+
+    def parts(self) -> List[str]:
+        return [name for name in PARTS if getattr(self, name)]
+
+    def token(self) -> str:
+        return repr(self)
+
+    @property
+    def needs_text(self) -> bool:
+        return self.text or self.markdown or self.combined or self.formulas
+
+    @property
+    def needs_pages(self) -> bool:
+        return self.needs_text or self.images
+
+
+PARTS = (
+    "text",
+    "markdown",
+    "combined",
+    "formulas",
+    "images",
+    "arrays",
+    "tables",
+)
+
+PROFILES: Dict[str, ExtractProfile] = {
+    "full": ExtractProfile(),
+    "text": ExtractProfile.from_parts(["text", "markdown", "combined"]),
+    "tables": ExtractProfile.from_parts(["tables"]),
+    "images": ExtractProfile.from_parts(["images", "arrays"]),
+}
+
+
+def resolve_profile(
+    profile: Union[None, str, ExtractProfile],
+) -> ExtractProfile:
+    if profile is None:
+        return PROFILES["full"]
+    if isinstance(profile, ExtractProfile):
+        return profile
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ValueError(
+            f"unknown extraction profile {profile!r}; "
+            f"expected one of {sorted(PROFILES)}"
+        ) from None
+
+
+class _ImageIndex:
+    # Per-document record of which xrefs appear on which pages and where
+    # each distinct image was written. `owned` limits decoding to the xrefs
+    # a page-range worker is responsible for; None means all of them.
+
+    def __init__(self, owned: Optional[Set[int]] = None):
+        self.owned = owned
+        self.refs: Dict[int, List[int]] = {}
+        self.files: Dict[int, Tuple[str, str]] = {}
+        self.digests: Dict[int, str] = {}
+
+    def wants(self, xref: int) -> bool:
+        if xref in self.files:
+            return False
+        return self.owned is None or xref in self.owned
+
+    def add_file(
+        self,
+        xref: int,
+        paths: Tuple[str, str],
+        digest: str,
+        seen: Optional[Dict[str, Tuple[str, str]]],
+    ) -> bool:
+        # False when identical content is already in the archive under
+        # another name; the xref then points at that copy
+        self.digests[xref] = digest
+        if seen is not None and digest in seen:
+            self.files[xref] = seen[digest]
+            return False
+        self.files[xref] = paths
+        if seen is not None:
+            seen[digest] = paths
+        return True
+
+    def manifest(self, paper_name: str) -> bytes:
+        pages: Dict[int, List[int]] = {}
+        for page_num, xrefs in self.refs.items():
+            for xref in xrefs:
+                pages.setdefault(xref, []).append(page_num + 1)
+        images = [
+            {
+                "file": self.files[xref][0],
+                "npy": self.files[xref][1],
+                "xref": xref,
+                "sha": self.digests.get(xref),
+                "pages": sorted(pages.get(xref, [])),
+            }
+            for xref in sorted(self.files)
+        ]
+        by_page = {
+            str(page_num + 1): [
+                self.files[x][0] for x in xrefs if x in self.files
+            ]
+            for page_num, xrefs in sorted(self.refs.items())
+        }
+        body = {"document": paper_name, "images": images, "pages": by_page}
+        return bytes_utf8(json.dumps(body, indent=2))
+
+
+def _page_artifacts(
+    pdf_obj: fitz.Document,
+    page: fitz.Page,
+    paper_name: str,
+    text: str,
+    images: _ImageIndex,
+    profile: ExtractProfile,
+    page_dict: Optional[Dict] = None,
+) -> Iterator[Artifact]:
     base = Path(paper_name)
+    page_num = page.number
 
-    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_obj:
-        for page_num in range(len(pdf_obj)):
-            page = pdf_obj.load_page(page_num)
-            text = page.get_text()
-
-            # text
-            txt_rel = base / "text" / f"{paper_name}_page_{page_num + 1}.txt"
-            md_rel = base / "text" / f"{paper_name}_page_{page_num + 1}.md"
-            files[str(txt_rel)] = bytes_utf8(text)
-            files[str(md_rel)] = bytes_utf8(f"# Page {page_num + 1}\n\n{text}")
-
-            # formulas
-            formulas = extract_formulas(text)
-            if formulas:
-                fmd_rel = (
-                    base
-                    / "formulas"
-                    / f"{paper_name}_page_{page_num + 1}_formulas.md"
-                )
-                md_block = "# Formulas\n\n" + "\n\n".join(
-                    [f"$$\n{f}\n$$" for f in formulas]
-                )
-                files[str(fmd_rel)] = bytes_utf8(md_block)
-
-            # images
-            for img_index, img in enumerate(page.get_images(full=True)):
-                xref = img[0]
-                base_image = pdf_obj.extract_image(xref)
-                image_bytes = base_image["image"]
-                image_ext = base_image.get("ext", "png")
-
-                img_rel = (
-                    base
-                    / "images"
-                    / f"{paper_name}_page_{page_num + 1}_img_{img_index + 1}.{image_ext}"
-                )
-                files[str(img_rel)] = image_bytes
+    # text
+    if profile.text:
+        txt_rel = base / "text" / f"{paper_name}_page_{page_num + 1}.txt"
+        yield str(txt_rel), bytes_utf8(text)
+    if profile.markdown:
+        md_rel = base / "text" / f"{paper_name}_page_{page_num + 1}.md"
+        yield str(md_rel), bytes_utf8(f"# Page {page_num + 1}\n\n{text}")
+
+    # formulas
+    formulas: List[str] = []
+    if profile.formulas:
+        with stage("formulas", doc=paper_name, page=page_num):
+            formulas = detect_formulas(text, profile.formula_mode, page_dict)
+    if formulas:
+        fmd_rel = (
+            base / "formulas" / f"{paper_name}_page_{page_num + 1}_formulas.md"
+        )
+        md_block = "# Formulas\n\n" + "\n\n".join(
+            [f"$$\n{f}\n$$" for f in formulas]
+        )
+        yield str(fmd_rel), bytes_utf8(md_block)
+
+    if not profile.images:
+        return
+
+    # images: each xref is decoded once, named after its first appearance
+    refs = images.refs.setdefault(page_num, [])
+    for img_index, img in enumerate(page.get_images(full=True)):
+        xref = img[0]
+        refs.append(xref)
+        if not images.wants(xref):
+            continue
+        with stage("images.decode", doc=paper_name, page=page_num) as ev:
+            base_image = pdf_obj.extract_image(xref)
+            image_bytes = base_image["image"]
+            image_ext = base_image.get("ext", "png")
+            ev["bytes"] = len(image_bytes)
+
+        stem = f"{paper_name}_page_{page_num + 1}_img_{img_index + 1}"
+        img_rel = str(base / "images" / f"{stem}.{image_ext}")
+        arr_rel, arr_blob = None, None
+        if profile.arrays:
+            arr_blob = _image_array(
+                pdf_obj, xref, image_bytes, profile, paper_name, page_num
+            )
+        if arr_blob is not None:
+            suffix = "npz" if profile.array_format == "npz" else "npy"
+            arr_rel = str(base / "images" / f"{stem}.{suffix}")
+        digest = hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+        images.add_file(xref, (img_rel, arr_rel), digest, None)
+        yield img_rel, image_bytes
+        if arr_rel is not None:
+            yield arr_rel, arr_blob
+
+
+def _image_array(
+    pdf_obj: fitz.Document,
+    xref: int,
+    image_bytes: bytes,
+    profile: ExtractProfile,
+    paper_name: str,
+    page_num: int,
+) -> Union[bytes, _SpillFile, None]:
+    if profile.array_format == "encoded":
+        import numpy as np
+
+        with stage("images.npy", doc=paper_name, page=page_num) as ev:
+            arr = np.frombuffer(image_bytes, dtype=np.uint8)
+            npy = npy_bytes_from_array(arr)
+            ev["bytes"] = len(npy)
+        return npy
+
+    with stage("images.pixels", doc=paper_name, page=page_num) as ev:
+        try:
+            pix = decode_pixmap(pdf_obj, xref, profile.array_downscale)
+        except (RuntimeError, ValueError):
+            # nothing MuPDF can turn into pixels; the image file still ships
+            return None
+        path = write_array_file(
+            pixmap_array(pix, profile.array_dtype), profile.array_format
+        )
+        ev["bytes"] = os.path.getsize(path)
+    return _SpillFile(path)
+
+
+def _manifest_artifacts(
+    paper_name: str, images: _ImageIndex
+) -> Iterator[Artifact]:
+    if images.files:
+        rel = Path(paper_name) / "images" / f"{paper_name}_images_manifest.json"
+        yield str(rel), images.manifest(paper_name)
+
+
+def _table_artifacts(page, paper_name: str) -> Iterator[Artifact]:
+    import pandas as pd
+
+    base = Path(paper_name)
+    page_num = page.page_number - 1
+    with stage("tables.detect", doc=paper_name, page=page_num) as ev:
+        tables = page.extract_tables()
+        ev["tables"] = len(tables or [])
+    for table_index, table in enumerate(tables or []):
+        filename_base = f"{paper_name}_page_{page_num + 1}_table_{table_index + 1}"
+        csv_rel = base / "tables" / f"{filename_base}.csv"
+        md_rel = base / "tables" / f"{filename_base}.md"
+
+        with stage("tables.markdown", doc=paper_name, page=page_num):
+            df = pd.DataFrame(table)
+            csv = df.to_csv(index=False, header=False).encode("utf-8")
+            try:
+                md = bytes_utf8(df.to_markdown(index=False))
+            except Exception:
+                simple = "\n".join([" | ".join(map(str, row)) for row in table])
+                md = bytes_utf8(simple)
+        yield str(csv_rel), csv
+        yield str(md_rel), md
+
+
+class _PageResult:
+    # Everything one page adds to the archive. A page decodes only the image
+    # xrefs that first appear on it, so the result depends on nothing but
+    # (document, page, profile) and can be cached or computed in any process.
+
+    def __init__(self, page_num: int, owned: Set[int]):
+        self.page_num = page_num
+        self.text: Optional[str] = None
+        self.artifacts: List[Artifact] = []
+        self.images = _ImageIndex(owned)
+
+    def to_record(self, cache: DiskCache, key: str) -> bytes:
+        # builtins only, so a record loads under any import path; payloads
+        # on disk become cache entries of their own, referenced by key
+        artifacts = []
+        for rel_path, blob in self.artifacts:
+            if isinstance(blob, _SpillFile):
+                file_key = cache_key(key, rel_path)
+                cache.put_file(file_key, blob.path)
+                blob = ("file", file_key)
+            artifacts.append((rel_path, blob))
+        return pickle.dumps(
+            (
+                self.page_num,
+                self.text,
+                artifacts,
+                self.images.refs,
+                self.images.files,
+                self.images.digests,
+            ),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+    @classmethod
+    def from_record(
+        cls, blob: bytes, cache: DiskCache
+    ) -> "Optional[_PageResult]":
+        try:
+            page_num, text, artifacts, refs, files, digests = pickle.loads(blob)
+        except Exception:
+            return None
+        res = cls(page_num, set())
+        res.text = text
+        for rel_path, payload in artifacts:
+            if isinstance(payload, tuple):
+                path = cache.get_path(payload[1])
+                if path is None:
+                    # evicted on its own; redo the page
+                    return None
+                payload = _SpillFile(str(path), owned=False)
+            res.artifacts.append((rel_path, payload))
+        res.images.refs = refs
+        res.images.files = files
+        res.images.digests = digests
+        return res
+
+
+def _plumber_input(src: Source):
+    # pdfplumber opens a path itself and reads an mmap like a file
+    if isinstance(src, (str, Path)):
+        return str(src)
+    if isinstance(src, mmap.mmap):
+        return src
+    return io.BytesIO(src)
+
+
+def _iter_pages(
+    pdf_bytes: Source,
+    paper_name: str,
+    pages: Sequence[int],
+    first: Dict[int, int],
+    profile: ExtractProfile,
+    table_hints: Optional[Set[int]] = None,
+) -> Iterator[_PageResult]:
+    owners: Dict[int, Set[int]] = {}
+    for xref, pno in first.items():
+        owners.setdefault(pno, set()).add(xref)
+
+    with open_source(pdf_bytes) as pdf_obj:
+        table_pages: List[int] = []
+        if profile.tables and profile.table_screen is None:
+            table_pages = list(pages)
+        elif profile.tables and table_hints is not None:
+            table_pages = [p for p in pages if p in table_hints]
+        elif profile.tables:
+            for page_num in pages:
+                with stage("tables.screen", doc=paper_name, page=page_num):
+                    page = pdf_obj.load_page(page_num)
+                    if is_table_candidate(page, profile.table_screen):
+                        table_pages.append(page_num)
 
-                arr = np.frombuffer(image_bytes, dtype=np.uint8)
-                npy_rel = (
-                    base
-                    / "images"
-                    / f"{paper_name}_page_{page_num + 1}_img_{img_index + 1}.npy"
+        plumber_pdf = None
+        plumber_pages: Dict[int, object] = {}
+        if table_pages:
+            # pdfplumber (and pdfminer under it) is only imported once
+            # tables run
+            import pdfplumber
+
+            with stage("tables.open", doc=paper_name):
+                plumber_pdf = pdfplumber.open(
+                    _plumber_input(pdf_bytes),
+                    pages=[p + 1 for p in table_pages],
                 )
-                files[str(npy_rel)] = npy_bytes_from_array(arr)
-
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as plumber_pdf:
-        for page_num, page in enumerate(plumber_pdf.pages):
-            tables = page.extract_tables()
-            if tables:
-                for table_index, table in enumerate(tables):
-                    df = pd.DataFrame(table)
-                    filename_base = f"{paper_name}_page_{page_num + 1}_table_{table_index + 1}"
-
-                    csv_rel = base / "tables" / f"{filename_base}.csv"
-                    files[str(csv_rel)] = df.to_csv(
-                        index=False, header=False
-                    ).encode("utf-8")
-
-                    try:
-                        md_rel = base / "tables" / f"{filename_base}.md"
-                        files[str(md_rel)] = bytes_utf8(
-                            df.to_markdown(index=False)
-                        )
-                    except Exception:
-                        md_rel = base / "tables" / f"{filename_base}.md"
-                        simple = "\n".join(
-                            [" | ".join(map(str, row)) for row in table]
+            plumber_pages = {p.page_number - 1: p for p in plumber_pdf.pages}
+
+        try:
+            for page_num in pages:
+                res = _PageResult(page_num, owners.get(page_num, set()))
+                if profile.needs_pages:
+                    page = pdf_obj.load_page(page_num)
+                    text = ""
+                    page_dict = None
+                    if profile.needs_text:
+                        with stage("text", doc=paper_name, page=page_num) as ev:
+                            # one text page serves both the plain text and
+                            # the span data layout formula detection reads
+                            tp = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+                            text = page.get_text(textpage=tp)
+                            layout = profile.formula_mode == "layout"
+                            if profile.formulas and layout:
+                                page_dict = page.get_text("dict", textpage=tp)
+                            ev["chars"] = len(text)
+                    if profile.combined:
+                        res.text = text
+                    res.artifacts.extend(
+                        _page_artifacts(
+                            pdf_obj,
+                            page,
+                            paper_name,
+                            text,
+                            res.images,
+                            profile,
+                            page_dict,
                         )
-                        files[str(md_rel)] = bytes_utf8(simple)
+                    )
+                plumber_page = plumber_pages.pop(page_num, None)
+                if plumber_page is not None:
+                    res.artifacts.extend(
+                        _table_artifacts(plumber_page, paper_name)
+                    )
+                    plumber_page.close()
+                yield res
+        finally:
+            if plumber_pdf is not None:
+                plumber_pdf.close()
 
-    # text
-    page_txts = []
-    idx = 1
-    while True:
-        key = str(base / "text" / f"{paper_name}_page_{idx}.txt")
-        if key not in files:
-            break
-        page_txts.append(files[key].decode("utf-8"))
-        idx += 1
-
-    combined = "\n\n".join(page_txts) if page_txts else ""
-    comb_dir = base / "combined_text"
-    files[str(comb_dir / f"{paper_name}_combined_all_text.txt")] = bytes_utf8(
-        combined
+
+def page_cache_key(
+    doc_key: str, paper_name: str, page_num: int, profile: ExtractProfile
+) -> str:
+    return cache_key(
+        "extract",
+        EXTRACTOR_VERSION,
+        doc_key,
+        paper_name,
+        page_num,
+        profile.token(),
     )
-    files[str(comb_dir / f"{paper_name}_combined_all_text.md")] = bytes_utf8(
-        f"# {paper_name} Combined Text\n\n{combined}"
+
+
+def _load_page(cache: DiskCache, key: str) -> Optional[_PageResult]:
+    with stage("cache.load") as ev:
+        blob = cache.get(key)
+        ev["bytes"] = len(blob) if blob else 0
+    return _PageResult.from_record(blob, cache) if blob else None
+
+
+def _store_page(cache: DiskCache, key: str, res: _PageResult) -> None:
+    with stage("cache.store") as ev:
+        blob = res.to_record(cache, key)
+        ev["bytes"] = len(blob)
+        cache.put(key, blob)
+
+
+class _CombinedText:
+    # page texts go straight to spooled files instead of a list in memory
+
+    def __init__(self, paper_name: str):
+        self.paper_name = paper_name
+        self.txt = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        self.md = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        self.md.write(bytes_utf8(f"# {paper_name} Combined Text\n\n"))
+        self.pages = 0
+
+    def add(self, text: str) -> None:
+        blob = bytes_utf8(text)
+        if self.pages:
+            blob = b"\n\n" + blob
+        self.txt.write(blob)
+        self.md.write(blob)
+        self.pages += 1
+
+    def artifacts(self) -> Iterator[Artifact]:
+        comb_dir = Path(self.paper_name) / "combined_text"
+        name = f"{self.paper_name}_combined_all_text"
+        yield str(comb_dir / f"{name}.txt"), self.txt
+        yield str(comb_dir / f"{name}.md"), self.md
+
+    def close(self) -> None:
+        self.txt.close()
+        self.md.close()
+
+
+def _num_pages(pdf_bytes: Source) -> int:
+    with open_source(pdf_bytes) as doc:
+        return len(doc)
+
+
+def _first_image_pages(pdf_bytes: Source) -> Tuple[int, Dict[int, int]]:
+    # listing image xrefs only walks page resources; nothing is decoded
+    first: Dict[int, int] = {}
+    with open_source(pdf_bytes) as doc:
+        for page in doc:
+            for img in page.get_images(full=True):
+                first.setdefault(img[0], page.number)
+        return len(doc), first
+
+
+def _doc_layout(
+    pdf_bytes: Source, profile: ExtractProfile, meta: Optional[DocMeta] = None
+) -> Tuple[int, Dict[int, int]]:
+    # from the ingestion metadata when there is some, without reopening
+    if meta is not None:
+        return meta.pages, meta.first_image_pages() if profile.images else {}
+    if profile.images:
+        return _first_image_pages(pdf_bytes)
+    return _num_pages(pdf_bytes), {}
+
+
+def _table_hints(
+    meta: Optional[DocMeta], profile: ExtractProfile
+) -> Optional[Set[int]]:
+    # table candidates found at ingestion, if it screened the same way
+    if meta is None or profile.table_screen != META_SCREEN:
+        return None
+    return set(meta.select("tables"))
+
+
+def _doc_artifacts(
+    paper_name: str,
+    results: Iterable[_PageResult],
+    profile: ExtractProfile,
+    seen_images: Optional[Dict[str, Tuple[str, str]]],
+) -> Iterator[Artifact]:
+    # stitches page results into the document's archive entries
+    combined = _CombinedText(paper_name) if profile.combined else None
+    images = _ImageIndex()
+    # identical images within one document are always written once
+    seen = seen_images if seen_images is not None else {}
+    advance(message=paper_name)
+    try:
+        for res in results:
+            if combined is not None and res.text is not None:
+                combined.add(res.text)
+            images.refs.update(res.images.refs)
+            skip: Set[str] = set()
+            for xref, paths in res.images.files.items():
+                digest = res.images.digests[xref]
+                if not images.add_file(xref, paths, digest, seen):
+                    skip.update(paths)
+            for rel_path, blob in res.artifacts:
+                if rel_path in skip:
+                    _release(blob)
+                else:
+                    yield rel_path, blob
+            advance(pages=1)
+        if combined is not None:
+            yield from combined.artifacts()
+        yield from _manifest_artifacts(paper_name, images)
+        advance(docs=1)
+    finally:
+        if combined is not None:
+            combined.close()
+
+
+def _page_results(
+    pdf_bytes: Source,
+    paper_name: str,
+    profile: ExtractProfile,
+    cache: Optional[DiskCache],
+) -> Iterator[_PageResult]:
+    if cache is None:
+        num_pages, first = _doc_layout(pdf_bytes, profile)
+        yield from _iter_pages(
+            pdf_bytes, paper_name, range(num_pages), first, profile
+        )
+        return
+
+    doc_key = source_key(pdf_bytes)
+    meta = known_meta(doc_key)
+    num_pages, first = _doc_layout(pdf_bytes, profile, meta)
+    hints = _table_hints(meta, profile)
+    keys = [
+        page_cache_key(doc_key, paper_name, p, profile)
+        for p in range(num_pages)
+    ]
+    page_num = 0
+    while page_num < num_pages:
+        res = _load_page(cache, keys[page_num])
+        if res is not None:
+            yield res
+            page_num += 1
+            continue
+        # one pass over the run of missing pages, each stored as soon as it
+        # is done so an interrupted job picks up from there
+        stop = page_num + 1
+        while stop < num_pages and keys[stop] not in cache:
+            stop += 1
+        for res in _iter_pages(
+            pdf_bytes,
+            paper_name,
+            range(page_num, stop),
+            first,
+            profile,
+            hints,
+        ):
+            _store_page(cache, keys[res.page_num], res)
+            yield res
+        page_num = stop
+
+
+def iter_pdf_artifacts(
+    pdf_bytes: Source,
+    paper_name: str,
+    seen_images: Optional[Dict[str, Tuple[str, str]]] = None,
+    profile: Union[None, str, ExtractProfile] = None,
+    cache: bool = False,
+) -> Iterator[Artifact]:
+    profile = resolve_profile(profile)
+    results = _page_results(
+        pdf_bytes, paper_name, profile, extract_cache if cache else None
     )
+    yield from _doc_artifacts(paper_name, results, profile, seen_images)
 
+
+def extract_pdf_content_to_memory(
+    pdf_bytes: Source,
+    paper_name: str,
+    profile: Union[None, str, ExtractProfile] = None,
+    cache: bool = False,
+) -> Dict[str, bytes]:
+    files: Dict[str, bytes] = {}
+    for rel_path, blob in iter_pdf_artifacts(
+        pdf_bytes, paper_name, profile=profile, cache=cache
+    ):
+        if isinstance(blob, _SpillFile):
+            with open(blob.path, "rb") as fh:
+                data = fh.read()
+            blob.release()
+            blob = data
+        elif not isinstance(blob, bytes):
+            blob.seek(0)
+            blob = blob.read()
+        files[rel_path] = blob
     return files
 
 
-def build_extraction_zip(pdf_items: List[Tuple[str, bytes]]) -> bytes:
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+def _release_result(res: "_PageResult") -> None:
+    for _, blob in res.artifacts:
+        _release(blob)
+
+
+def _discard_results(fut) -> None:
+    # a worker result nobody will consume; drop its temporary files
+    if not fut.cancelled() and fut.exception() is None:
+        for res in fut.result()[0]:
+            _release_result(res)
+
+
+def _task_source(src: Source) -> Tuple[str, Optional[_SpillFile]]:
+    # what worker processes are sent: always a path. An in-memory document
+    # is written to a temporary file once, instead of being pickled into
+    # every task; the _SpillFile is that file, to release when done.
+    if isinstance(src, (str, Path)):
+        return str(src), None
+    fd, path = tempfile.mkstemp(prefix="pdfwb_task_", suffix=".pdf")
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(src)
+    return path, _SpillFile(path)
+
+
+def _extract_pages(
+    pdf_bytes: Source,
+    paper_name: str,
+    pages: List[int],
+    first: Dict[int, int],
+    profile: ExtractProfile,
+    record: bool = False,
+    table_hints: Optional[Set[int]] = None,
+) -> Tuple[List[_PageResult], List[Dict]]:
+    # runs in a worker process, so timings travel back with the results
+    rec = Recorder() if record else None
+    with recording(rec):
+        results = list(
+            _iter_pages(
+                pdf_bytes, paper_name, pages, first, profile, table_hints
+            )
+        )
+    return results, rec.events if rec else []
+
+
+def page_ranges(num_pages: int, chunks: int) -> List[Tuple[int, int]]:
+    size = math.ceil(num_pages / max(1, chunks))
+    size = min(MAX_PAGES_PER_TASK, max(MIN_PAGES_PER_TASK, size))
+    return [
+        (start, min(start + size, num_pages))
+        for start in range(0, num_pages, size)
+    ]
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    # kept alive between calls so worker start-up is paid once per process;
+    # background jobs share it, hence the lock
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=mp.get_context("spawn")
+            )
+            _executor_workers = workers
+        return _executor
+
+
+def _write_artifact(zf: zipfile.ZipFile, rel_path: str, blob) -> None:
+    with stage("zip.write") as ev:
+        if isinstance(blob, bytes):
+            zf.writestr(rel_path, blob)
+            ev["bytes"] = len(blob)
+            return
+        if isinstance(blob, _SpillFile):
+            try:
+                with open(blob.path, "rb") as src:
+                    with zf.open(rel_path, "w", force_zip64=True) as dst:
+                        shutil.copyfileobj(src, dst, 1 << 20)
+                    ev["bytes"] = src.tell()
+            finally:
+                blob.release()
+            return
+        blob.seek(0)
+        with zf.open(rel_path, "w", force_zip64=True) as dst:
+            shutil.copyfileobj(blob, dst, 1 << 20)
+        ev["bytes"] = blob.tell()
+
+
+def _parallel_artifacts(
+    pdf_items: Iterable[Tuple[str, Source]],
+    workers: int,
+    seen_images: Optional[Dict[str, Tuple[str, str]]],
+    profile: ExtractProfile,
+    cache: Optional[DiskCache],
+) -> Iterator[Artifact]:
+    ex = _get_executor(workers)
+    rec = current_recorder()
+    # temporary copies of in-memory documents the workers read
+    task_files: List[_SpillFile] = []
+
+    def segments():
+        # one segment per page range: cached pages are loaded here, the
+        # rest of the range goes to a worker as a single task, or is done
+        # here when the whole document is short
         for label, data in pdf_items:
             paper = sanitize(Path(label).stem)
-            files = extract_pdf_content_to_memory(data, paper)
-            for rel_path, blob in files.items():
-                zf.writestr(str(rel_path), blob)
-    return buf.getvalue()
+            doc_key = source_key(data) if cache is not None else ""
+            meta = known_meta(doc_key) if doc_key else None
+            num_pages, first = _doc_layout(data, profile, meta)
+            hints = _table_hints(meta, profile)
+            serial = num_pages <= SERIAL_PAGES
+            if serial:
+                ranges = [(0, num_pages)]
+            else:
+                ranges = page_ranges(num_pages, workers)
+            task_src: Optional[str] = None
+            task_file: Optional[_SpillFile] = None
+            for i, (a, b) in enumerate(ranges):
+                keys = {
+                    p: page_cache_key(doc_key, paper, p, profile)
+                    for p in range(a, b)
+                }
+                missing = [
+                    p for p in range(a, b) if cache is None or keys[p] not in cache
+                ]
+                # each xref is decoded by the page where it first appears
+                owned = {x: p for x, p in first.items() if a <= p < b}
+                range_hints = None
+                if hints is not None:
+                    range_hints = {p for p in hints if a <= p < b}
+                fut = None
+                if missing and not serial:
+                    if task_src is None:
+                        task_src, task_file = _task_source(data)
+                        if task_file is not None:
+                            task_files.append(task_file)
+                    fut = ex.submit(
+                        _extract_pages,
+                        task_src,
+                        paper,
+                        missing,
+                        owned,
+                        profile,
+                        rec is not None,
+                        range_hints,
+                    )
+                last = i == len(ranges) - 1
+                # the document's last range is consumed after all the
+                # others, so its temporary copy can go then
+                done_with = task_file if last else None
+                seg = (paper, last, data, (a, b), keys, owned, range_hints)
+                yield seg + (missing, done_with, fut)
+
+    def range_results(seg) -> Iterator[_PageResult]:
+        paper, _, data, (a, b), keys, owned, hints, missing, _, fut = seg
+        computed: Dict[int, _PageResult] = {}
+        results: List[_PageResult] = []
+        if fut is not None:
+            try:
+                results, events = wait(fut)
+            except BaseException:
+                # cancelled while waiting; the task's results go nowhere
+                if not fut.cancel():
+                    fut.add_done_callback(_discard_results)
+                raise
+            if rec is not None:
+                rec.extend(events)
+        elif missing:
+            results = list(
+                _iter_pages(data, paper, missing, owned, profile, hints)
+            )
+        for res in results:
+            if cache is not None:
+                _store_page(cache, keys[res.page_num], res)
+            computed[res.page_num] = res
+        try:
+            for p in range(a, b):
+                res = computed.pop(p, None)
+                if res is None:
+                    res = _load_page(cache, keys[p])
+                if res is None:
+                    # evicted since the range was planned
+                    with closing(
+                        _iter_pages(data, paper, [p], owned, profile, hints)
+                    ) as one:
+                        res = next(one)
+                yield res
+        finally:
+            for res in computed.values():
+                _release_result(res)
+
+    # bounded look-ahead: at most 2 * workers ranges are in flight, and
+    # results are consumed in submission order so the archive is stable
+    todo = segments()
+    pending: Deque = deque(itertools.islice(todo, 2 * workers))
+
+    def take():
+        seg = pending.popleft()
+        nxt = next(todo, None)
+        if nxt is not None:
+            pending.append(nxt)
+        return seg
+
+    def doc_results() -> Iterator[_PageResult]:
+        while True:
+            seg = take()
+            yield from range_results(seg)
+            if seg[1]:
+                if seg[-2] is not None:
+                    seg[-2].release()
+                return
+
+    try:
+        while pending:
+            paper = pending[0][0]
+            yield from _doc_artifacts(
+                paper, doc_results(), profile, seen_images
+            )
+    finally:
+        for seg in pending:
+            fut = seg[-1]
+            if fut is not None and not fut.cancel():
+                fut.add_done_callback(_discard_results)
+        # a task still running has the file open already or fails to open
+        # it; either way its results are discarded above
+        for task_file in task_files:
+            task_file.release()
+
+
+def write_extraction_zip(
+    pdf_items: Iterable[Tuple[str, Source]],
+    dest: Union[str, Path, BinaryIO],
+    workers: Optional[int] = None,
+    dedupe_images: bool = False,
+    profile: Union[None, str, ExtractProfile] = None,
+    cache: bool = False,
+) -> None:
+    workers = workers or WORKERS
+    profile = resolve_profile(profile)
+    # shared across documents only when cross-document dedupe is asked for
+    seen_images: Optional[Dict[str, Tuple[str, str]]] = (
+        {} if dedupe_images else None
+    )
+    with zipfile.ZipFile(dest, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        if workers <= 1:
+            for label, data in pdf_items:
+                paper = sanitize(Path(label).stem)
+                for rel_path, blob in iter_pdf_artifacts(
+                    data, paper, seen_images, profile, cache
+                ):
+                    _write_artifact(zf, rel_path, blob)
+        else:
+            for rel_path, blob in _parallel_artifacts(
+                pdf_items,
+                workers,
+                seen_images,
+                profile,
+                extract_cache if cache else None,
+            ):
+                _write_artifact(zf, rel_path, blob)
+
+
+def build_extraction_zip_file(
+    pdf_items: Iterable[Tuple[str, Source]],
+    workers: Optional[int] = None,
+    dedupe_images: bool = False,
+    profile: Union[None, str, ExtractProfile] = None,
+    cache: bool = False,
+) -> BinaryIO:
+    # built on disk, handed back as a plain reader (which st.download_button
+    # accepts); the name is unlinked so the data goes away on close
+    fd, path = tempfile.mkstemp(prefix="pdfwb_", suffix=".zip")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            write_extraction_zip(
+                pdf_items, out, workers, dedupe_images, profile, cache
+            )
+        reader = open(path, "rb")
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+    return reader
+
+
+def build_extraction_zip(
+    pdf_items: Iterable[Tuple[str, Source]],
+    workers: Optional[int] = None,
+    dedupe_images: bool = False,
+    profile: Union[None, str, ExtractProfile] = None,
+    cache: bool = False,
+) -> bytes:
+    with build_extraction_zip_file(
+        pdf_items, workers, dedupe_images, profile, cache
+    ) as fh:
+        return fh.read()
@@ -0,0 +1,153 @@
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# A line is a formula candidate when it holds one of these. Prose uses
+# "=", "^" and the odd Greek letter too, so the "strict" and "layout" modes
+# also check that the line does not read like prose.
+STRONG_SYMBOLS = "∑∫√παβγδεζηθικλμνξοπρστυφχψωΓΔΘΛΞΠΣΦΨΩ"
+WEAK_SYMBOLS = "=^"
+
+FORMULA_MODES = ("text", "strict", "layout")
+
+# font name fragments of the usual TeX / OpenType math and symbol fonts
+MATH_FONT_HINTS = (
+    "cmmi",
+    "cmsy",
+    "cmex",
+    "msam",
+    "msbm",
+    "eufm",
+    "rsfs",
+    "esint",
+    "stix",
+    "math",
+    "symbol",
+    "mtmi",
+    "mtsy",
+)
+
+# every line break str.splitlines() knows besides "\n"; pages holding any
+# are folded to "\n" first so lines split exactly as before
+_OTHER_BREAKS = "\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+# a doubled backslash (as in LaTeX line breaks) counts as a symbol too
+_NEEDLES = tuple(STRONG_SYMBOLS + WEAK_SYMBOLS) + ("\\\\",)
+
+
+def _has_symbol(line: str) -> bool:
+    return any(n in line for n in _NEEDLES)
+
+
+def _candidate_lines(text: str) -> Iterator[Tuple[int, str]]:
+    # (offset, line) for each line holding a symbol, in page order. Each
+    # symbol is located with str.find, which scans in C far faster than a
+    # regex character class, and lines without symbols cost nothing.
+    for brk in _OTHER_BREAKS:
+        if brk in text:
+            text = text.replace(brk, "\n")
+    lines: Dict[int, int] = {}
+    for needle in _NEEDLES:
+        i = text.find(needle)
+        while i >= 0:
+            start = text.rfind("\n", 0, i) + 1
+            end = text.find("\n", i)
+            if end < 0:
+                end = len(text)
+            lines[start] = end
+            i = text.find(needle, end)
+    for start in sorted(lines):
+        yield start, text[start : lines[start]]
+
+
+def _looks_like_math(line: str) -> bool:
+    # prose is mostly words; formulas are mostly symbols, numbers and
+    # one-letter variables
+    tokens = line.split()
+    words = 0
+    for t in tokens:
+        t = t.strip(".,;:!?()[]\"'")
+        if len(t) > 1 and t.isalpha():
+            words += 1
+    return words * 2 < len(tokens)
+
+
+def _keep(line: str, strict: bool) -> bool:
+    if len(line) <= 3:
+        return False
+    return not strict or _looks_like_math(line)
+
+
+def extract_formulas(text: str, strict: bool = False) -> List[str]:
+    found = []
+    for _, line in _candidate_lines(text):
+        line = line.strip()
+        if _keep(line, strict):
+            found.append(line)
+    return found
+
+
+def extract_formulas_batch(
+    texts: Iterable[str], strict: bool = False
+) -> List[List[str]]:
+    # all pages in one scan; match offsets map back to their page
+    pages = list(texts)
+    starts: List[int] = []
+    pos = 0
+    for t in pages:
+        starts.append(pos)
+        pos += len(t) + 1
+    found: List[List[str]] = [[] for _ in pages]
+    for offset, line in _candidate_lines("\n".join(pages)):
+        line = line.strip()
+        if _keep(line, strict):
+            found[bisect_right(starts, offset) - 1].append(line)
+    return found
+
+
+def _is_math_font(name: str) -> bool:
+    name = name.lower()
+    return any(h in name for h in MATH_FONT_HINTS)
+
+
+def formulas_from_page_dict(page_dict: Dict[str, Any]) -> List[str]:
+    # Layout-aware pass over page.get_text("dict"). A line is math when a
+    # fifth of its glyphs are set in a math font or as superscripts, when it
+    # has sub/superscript-sized spans next to "=" or "^", or when it passes
+    # the strict text check (a symbol and not reading like prose).
+    found = []
+    for block in page_dict.get("blocks", []):
+        if block.get("type", 0) != 0:
+            continue
+        for line in block.get("lines", []):
+            spans = [s for s in line.get("spans", []) if s["text"].strip()]
+            if not spans:
+                continue
+            text = "".join(s["text"] for s in line["spans"]).strip()
+            if len(text) <= 3:
+                continue
+            glyphs = sum(len(s["text"].strip()) for s in spans)
+            math_glyphs = sum(
+                len(s["text"].strip())
+                for s in spans
+                if _is_math_font(s["font"]) or s["flags"] & 1
+            )
+            base = max(s["size"] for s in spans)
+            scripts = any(s["size"] < 0.9 * base for s in spans)
+            if (
+                math_glyphs * 5 >= glyphs
+                or (scripts and any(c in text for c in WEAK_SYMBOLS))
+                or (_has_symbol(text) and _looks_like_math(text))
+            ):
+                found.append(text)
+    return found
+
+
+def detect_formulas(
+    text: str, mode: str = "text", page_dict: Optional[Dict[str, Any]] = None
+) -> List[str]:
+    if mode == "layout" and page_dict is not None:
+        return formulas_from_page_dict(page_dict)
+    if mode not in FORMULA_MODES:
+        raise ValueError(
+            f"unknown formula mode {mode!r}; expected one of {FORMULA_MODES}"
+        )
+    return extract_formulas(text, strict=mode != "text")
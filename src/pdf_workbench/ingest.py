@@ -0,0 +1,229 @@
+import os
+import pickle
+import threading
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import pymupdf as fitz
+
+from .cache import DiskCache, cache_key, cache_root
+from .docpool import Source, open_source, source_key, source_size
+from .profiling import stage
+from .search import TextIndex, store_text_index
+from .tables import TableScreen, is_table_candidate
+
+# documents read at once in the background; MuPDF work itself holds the
+# GIL, so more threads mostly overlap hashing and file I/O
+INGEST_WORKERS = int(os.environ.get("PDF_WORKBENCH_INGEST_WORKERS", "4"))
+META_CACHE_MB = int(os.environ.get("PDF_WORKBENCH_META_CACHE_MB", "64"))
+# bump when DocMeta or how it is computed changes
+META_VERSION = 1
+# the screen behind the table hint; extraction reuses the hint only for
+# profiles that screen with the same settings
+META_SCREEN = TableScreen()
+
+meta_cache = DiskCache(cache_root() / "meta", META_CACHE_MB << 20)
+
+# per-page flag bits
+HAS_TEXT = 1
+TABLE_HINT = 2
+
+CONTENT_KINDS = ("text", "no_text", "images", "tables")
+
+
+@dataclass(frozen=True, eq=False)
+class DocMeta:
+    # What one pass over a document learns about every page, kept compact:
+    # page sizes as float32 arrays, one flag byte per page, and the image
+    # xrefs of all pages in one int array, page p owning
+    # xrefs[offsets[p]:offsets[p + 1]].
+    key: str
+    size: int
+    widths: array
+    heights: array
+    flags: bytes
+    xrefs: array
+    offsets: array
+
+    @property
+    def pages(self) -> int:
+        return len(self.flags)
+
+    def page_size(self, page: int) -> Tuple[float, float]:
+        return self.widths[page], self.heights[page]
+
+    def has_text(self, page: int) -> bool:
+        return bool(self.flags[page] & HAS_TEXT)
+
+    def table_hint(self, page: int) -> bool:
+        return bool(self.flags[page] & TABLE_HINT)
+
+    def image_xrefs(self, page: int) -> List[int]:
+        return self.xrefs[self.offsets[page] : self.offsets[page + 1]].tolist()
+
+    def first_image_pages(self) -> Dict[int, int]:
+        # xref -> first page showing it, as extraction assigns image owners
+        first: Dict[int, int] = {}
+        for page in range(self.pages):
+            for xref in self.image_xrefs(page):
+                first.setdefault(xref, page)
+        return first
+
+    def select(self, kind: str) -> List[int]:
+        if kind == "text":
+            return [p for p, f in enumerate(self.flags) if f & HAS_TEXT]
+        if kind == "no_text":
+            return [p for p, f in enumerate(self.flags) if not f & HAS_TEXT]
+        if kind == "tables":
+            return [p for p, f in enumerate(self.flags) if f & TABLE_HINT]
+        if kind == "images":
+            off = self.offsets
+            return [p for p in range(self.pages) if off[p + 1] > off[p]]
+        raise ValueError(
+            f"unknown page kind {kind!r}; expected one of {CONTENT_KINDS}"
+        )
+
+    def to_record(self) -> bytes:
+        return pickle.dumps(
+            (
+                META_VERSION,
+                self.key,
+                self.size,
+                self.widths.tobytes(),
+                self.heights.tobytes(),
+                self.flags,
+                self.xrefs.tobytes(),
+                self.offsets.tobytes(),
+            ),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+    @classmethod
+    def from_record(cls, blob: bytes) -> "Optional[DocMeta]":
+        try:
+            version, key, size, w, h, flags, xrefs, offsets = pickle.loads(
+                blob
+            )
+        except Exception:
+            return None
+        if version != META_VERSION:
+            return None
+        return cls(
+            key,
+            size,
+            array("f", w),
+            array("f", h),
+            flags,
+            array("i", xrefs),
+            array("i", offsets),
+        )
+
+
+def read_meta(
+    doc: fitz.Document, key: str, size: int
+) -> Tuple[DocMeta, List[str]]:
+    # one pass over the pages; the page text comes back too so the search
+    # index is built from it instead of a second pass
+    widths, heights = array("f"), array("f")
+    flags = bytearray()
+    xrefs, offsets = array("i"), array("i", [0])
+    texts: List[str] = []
+    for page in doc:
+        rect = page.rect
+        widths.append(rect.width)
+        heights.append(rect.height)
+        text = page.get_text("text")
+        texts.append(text)
+        flag = HAS_TEXT if text.strip() else 0
+        if is_table_candidate(page, META_SCREEN):
+            flag |= TABLE_HINT
+        flags.append(flag)
+        xrefs.extend(img[0] for img in page.get_images(full=True))
+        offsets.append(len(xrefs))
+    meta = DocMeta(key, size, widths, heights, bytes(flags), xrefs, offsets)
+    return meta, texts
+
+
+def _meta_key(key: str) -> str:
+    return cache_key("meta", META_VERSION, key)
+
+
+class MetaIndex:
+    # Process-wide metadata by content key, like doc_pool. Documents are
+    # read on a thread pool, so a batch of uploads is indexed at once and
+    # the page that submitted them does not wait.
+
+    def __init__(self, workers: int = INGEST_WORKERS):
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="pdfwb-ingest"
+        )
+        self._metas: Dict[str, DocMeta] = {}
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[DocMeta]:
+        # from memory or the disk cache; never reads the document
+        meta = self._metas.get(key)
+        if meta is None:
+            blob = meta_cache.get(_meta_key(key))
+            meta = DocMeta.from_record(blob) if blob else None
+            if meta is not None:
+                with self._lock:
+                    self._metas[key] = meta
+        return meta
+
+    def submit(self, src: Source, key: Optional[str] = None) -> Future:
+        key = key or source_key(src)
+        with self._lock:
+            fut = self._pending.get(key)
+            if fut is not None:
+                return fut
+            meta = self._metas.get(key)
+            if meta is not None:
+                fut = Future()
+                fut.set_result(meta)
+                return fut
+            fut = self._pool.submit(copy_context().run, self._read, src, key)
+            self._pending[key] = fut
+        return fut
+
+    def _read(self, src: Source, key: str) -> DocMeta:
+        try:
+            meta = self.get(key)
+            if meta is not None:
+                return meta
+            with stage("ingest.meta") as ev:
+                with open_source(src) as doc:
+                    meta, texts = read_meta(doc, key, source_size(src))
+                ev["pages"] = meta.pages
+            meta_cache.put(_meta_key(key), meta.to_record())
+            store_text_index(key, TextIndex.from_texts(texts))
+            with self._lock:
+                self._metas[key] = meta
+            return meta
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def result(self, src: Source, key: Optional[str] = None) -> DocMeta:
+        # waits for a submitted read, or reads the document now
+        key = key or source_key(src)
+        return self.get(key) or self.submit(src, key).result()
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._metas.pop(key, None)
+
+
+meta_index = MetaIndex()
+
+
+def doc_meta(src: Source, key: Optional[str] = None) -> DocMeta:
+    return meta_index.result(src, key)
+
+
+def known_meta(key: str) -> Optional[DocMeta]:
+    return meta_index.get(key)
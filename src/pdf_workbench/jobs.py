@@ -0,0 +1,265 @@
+import cProfile
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as futures_wait
+from contextvars import ContextVar, copy_context
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Optional
+
+from .profiling import Recorder, current_recorder, profile_bytes
+
+# jobs run this many at a time per server process; the rest queue
+JOB_WORKERS = int(os.environ.get("PDF_WORKBENCH_JOB_WORKERS", "2"))
+# finished jobs and their output files are dropped after this long
+JOB_TTL_S = int(os.environ.get("PDF_WORKBENCH_JOB_TTL_S", "3600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    # One background operation. Only the worker thread writes the progress
+    # counters; the UI reads them on each rerun.
+
+    def __init__(
+        self,
+        kind: str,
+        label: str,
+        file_name: str,
+        mime: str,
+        docs_total: int = 0,
+        pages_total: int = 0,
+        doc_keys: Iterable[str] = (),
+        on_finish: Optional[Callable[[], None]] = None,
+    ):
+        self.id = f"{kind}-{uuid.uuid4().hex[:12]}"
+        self.kind = kind
+        self.label = label
+        self.file_name = file_name
+        self.mime = mime
+        self.docs_total = docs_total
+        self.pages_total = pages_total
+        self.doc_keys = list(doc_keys)
+        self.docs_done = 0
+        self.pages_done = 0
+        self.message = ""
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        self.path: Optional[str] = None
+        self.size = 0
+        self.recorder: Optional[Recorder] = None
+        # cProfile dump of the job's own thread, when the recorder profiles
+        self.profile = b""
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._cancel = threading.Event()
+        self._future: Optional[Future] = None
+        self._on_finish = on_finish
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def fraction(self) -> float:
+        if self.status == DONE:
+            return 1.0
+        if self.pages_total:
+            return min(1.0, self.pages_done / self.pages_total)
+        if self.docs_total:
+            return min(1.0, self.docs_done / self.docs_total)
+        return 0.0
+
+    def cancel(self) -> None:
+        # a queued job never starts; a running one stops at its next
+        # checkpoint
+        self._cancel.set()
+        if self._future is not None and self._future.cancel():
+            self._finish(CANCELLED)
+
+    def _finish(self, status: str) -> None:
+        self.status = status
+        self.finished = time.time()
+        on_finish, self._on_finish = self._on_finish, None
+        if on_finish is not None:
+            on_finish()
+
+
+_current: ContextVar[Optional[Job]] = ContextVar(
+    "pdf_workbench_job", default=None
+)
+
+
+def current_job() -> Optional[Job]:
+    return _current.get()
+
+
+def checkpoint() -> None:
+    job = _current.get()
+    if job is not None and job.cancelled:
+        raise JobCancelled(job.id)
+
+
+def advance(
+    docs: int = 0, pages: int = 0, message: Optional[str] = None
+) -> None:
+    # progress from inside a job (no-op outside one); also a cancellation
+    # point
+    job = _current.get()
+    if job is None:
+        return
+    job.docs_done += docs
+    job.pages_done += pages
+    if message is not None:
+        job.message = message
+    checkpoint()
+
+
+def wait(fut: Future, poll_s: float = 0.25) -> Any:
+    # fut.result(), but a cancelled job stops waiting
+    if _current.get() is not None:
+        while not fut.done():
+            checkpoint()
+            futures_wait([fut], timeout=poll_s)
+    return fut.result()
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class JobRunner:
+    # Process-wide queue shared by every session. Sessions keep only job
+    # ids, so a rerun (or a second browser tab) finds its jobs and their
+    # output files again. `fn` writes the job's output to the file it is
+    # handed; stage() timings go to the recorder active at submit time.
+    # `on_finish` runs once the job stops, however it stops.
+
+    def __init__(self, workers: int = JOB_WORKERS, ttl_s: int = JOB_TTL_S):
+        self.ttl_s = ttl_s
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="pdfwb-job"
+        )
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        kind: str,
+        fn: Callable[[BinaryIO], None],
+        label: str = "",
+        file_name: str = "output",
+        mime: str = "application/octet-stream",
+        docs_total: int = 0,
+        pages_total: int = 0,
+        doc_keys: Iterable[str] = (),
+        on_finish: Optional[Callable[[], None]] = None,
+    ) -> Job:
+        self.sweep()
+        job = Job(
+            kind,
+            label or kind,
+            file_name,
+            mime,
+            docs_total,
+            pages_total,
+            doc_keys,
+            on_finish,
+        )
+        job.recorder = current_recorder()
+        with self._lock:
+            self._jobs[job.id] = job
+        job._future = self._pool.submit(copy_context().run, self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable[[BinaryIO], None]) -> None:
+        if job.cancelled:
+            job._finish(CANCELLED)
+            return
+        job.status = RUNNING
+        job.started = time.time()
+        suffix = os.path.splitext(job.file_name)[1]
+        fd, path = tempfile.mkstemp(prefix="pdfwb_job_", suffix=suffix)
+        token = _current.set(job)
+        # cProfile follows only the thread that enables it, and the
+        # recorder's profiler belongs to the script thread
+        profiler = None
+        if job.recorder is not None and job.recorder.profiler is not None:
+            profiler = cProfile.Profile()
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if profiler is None:
+                    fn(out)
+                else:
+                    profiler.enable()
+                    try:
+                        fn(out)
+                    finally:
+                        profiler.disable()
+                        job.profile = profile_bytes(profiler)
+                job.size = out.tell()
+        except JobCancelled:
+            _unlink(path)
+            job._finish(CANCELLED)
+        except Exception as exc:
+            _unlink(path)
+            job.error = f"{type(exc).__name__}: {exc}"
+            job._finish(FAILED)
+        else:
+            if job.cancelled:
+                # finished anyway, but nobody wants the output any more
+                _unlink(path)
+                job._finish(CANCELLED)
+            else:
+                job.path = path
+                job._finish(DONE)
+        finally:
+            _current.reset(token)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self, job_ids: Iterable[str]) -> List[Job]:
+        return [j for j in (self._jobs.get(i) for i in job_ids) if j]
+
+    def forget(self, job_id: str) -> None:
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is None:
+            return
+        if job.active:
+            # the worker still owns the file; it removes it on cancel
+            job.cancel()
+        elif job.path:
+            _unlink(job.path)
+
+    def sweep(self) -> None:
+        cutoff = time.time() - self.ttl_s
+        stale = [
+            j.id
+            for j in list(self._jobs.values())
+            if j.finished is not None and j.finished < cutoff
+        ]
+        for job_id in stale:
+            self.forget(job_id)
+
+
+job_runner = JobRunner()
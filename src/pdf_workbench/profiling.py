@@ -0,0 +1,133 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+
+class Recorder:
+    # Collects one event per timed stage: name, optional page index,
+    # duration and whatever counters the stage attached (bytes, pages...).
+
+    def __init__(self, profile: bool = False):
+        self.events: List[Dict[str, Any]] = []
+        self.profiler: Optional[cProfile.Profile] = (
+            cProfile.Profile() if profile else None
+        )
+        self._lock = threading.Lock()
+
+    def add(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self.events.append(event)
+
+    def extend(self, events: Iterable[Dict[str, Any]]) -> None:
+        with self._lock:
+            self.events.extend(events)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        # stages that ran under a save profile are split by profile
+        totals: Dict[str, Dict[str, Any]] = {}
+        for ev in self.events:
+            name = ev["stage"]
+            if ev.get("profile"):
+                name = f"{name} [{ev['profile']}]"
+            row = totals.setdefault(
+                name,
+                {"stage": name, "calls": 0, "seconds": 0.0, "bytes": 0},
+            )
+            row["calls"] += 1
+            row["seconds"] += ev["seconds"]
+            row["bytes"] += ev.get("bytes", 0)
+        return sorted(totals.values(), key=lambda r: -r["seconds"])
+
+    def slowest_pages(self, n: int = 20) -> List[Dict[str, Any]]:
+        per_page: Dict[tuple, float] = {}
+        for ev in self.events:
+            if ev.get("page") is None:
+                continue
+            key = (ev.get("doc", ""), ev["page"])
+            per_page[key] = per_page.get(key, 0.0) + ev["seconds"]
+        rows = [
+            {"doc": d, "page": p + 1, "seconds": s}
+            for (d, p), s in per_page.items()
+        ]
+        return sorted(rows, key=lambda r: -r["seconds"])[:n]
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"summary": self.summary(), "events": self.events}, indent=2
+        )
+
+    def profile_stats(self) -> bytes:
+        if self.profiler is None:
+            return b""
+        return profile_bytes(self.profiler)
+
+    def profile_text(self, limit: int = 30) -> str:
+        if self.profiler is None:
+            return ""
+        out = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+def profile_bytes(profiler: cProfile.Profile) -> bytes:
+    # the binary format pstats / snakeviz load, as bytes for a download
+    fd, path = tempfile.mkstemp(suffix=".prof")
+    os.close(fd)
+    try:
+        profiler.dump_stats(path)
+        with open(path, "rb") as fh:
+            return fh.read()
+    finally:
+        os.unlink(path)
+
+
+_current: ContextVar[Optional[Recorder]] = ContextVar(
+    "pdf_workbench_recorder", default=None
+)
+
+
+def current_recorder() -> Optional[Recorder]:
+    return _current.get()
+
+
+@contextmanager
+def recording(recorder: Optional[Recorder] = None) -> Iterator[Optional[Recorder]]:
+    # route stage() events inside the block to `recorder`; None is a no-op
+    if recorder is None:
+        yield None
+        return
+    token = _current.set(recorder)
+    if recorder.profiler is not None:
+        recorder.profiler.enable()
+    try:
+        yield recorder
+    finally:
+        if recorder.profiler is not None:
+            recorder.profiler.disable()
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+    # Times the block when a recorder is active. The yielded dict becomes
+    # the event, so the block can attach counters (ev["bytes"] = ...).
+    rec = _current.get()
+    ev: Dict[str, Any] = {"stage": name, **fields}
+    if rec is None:
+        yield ev
+        return
+    t0 = time.perf_counter()
+    try:
+        yield ev
+    finally:
+        ev["seconds"] = time.perf_counter() - t0
+        rec.add(ev)
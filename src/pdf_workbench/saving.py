@@ -0,0 +1,154 @@
+import io
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Union
+
+import pymupdf as fitz
+
+from .profiling import stage
+
+
+@dataclass(frozen=True)
+class SaveProfile:
+    # keyword arguments for Document.save(); see SAVE_PROFILES
+    name: str
+    garbage: int = 0
+    deflate: bool = False
+    deflate_images: bool = False
+    deflate_fonts: bool = False
+    use_objstms: bool = False
+    linear: bool = False
+    # an output identical to its input (a whole file, pages in order) is
+    # handed back as the input bytes instead of being rewritten
+    passthrough: bool = False
+
+    def options(self) -> Dict[str, Any]:
+        opts: Dict[str, Any] = {
+            "garbage": self.garbage,
+            "deflate": self.deflate,
+            "deflate_images": self.deflate_images,
+            "deflate_fonts": self.deflate_fonts,
+            "use_objstms": self.use_objstms,
+        }
+        if self.linear and linear_supported():
+            opts["linear"] = True
+        return opts
+
+
+SAVE_PROFILES: Dict[str, SaveProfile] = {
+    # no compression; garbage=1 only drops objects no page references any
+    # more (what a filtered document leaves behind), which costs one pass
+    "fast": SaveProfile("fast", garbage=1, passthrough=True),
+    # deduplicated objects, everything deflated, object streams
+    "compact": SaveProfile(
+        "compact",
+        garbage=3,
+        deflate=True,
+        deflate_images=True,
+        deflate_fonts=True,
+        use_objstms=True,
+    ),
+    # first page first for web delivery. MuPDF 1.24+ can no longer
+    # linearise; there this is "compact" without object streams, which
+    # older viewers parse more readily.
+    "linear": SaveProfile(
+        "linear",
+        garbage=3,
+        deflate=True,
+        deflate_images=True,
+        deflate_fonts=True,
+        linear=True,
+    ),
+}
+
+DEFAULT_SAVE_PROFILE = os.environ.get("PDF_WORKBENCH_SAVE_PROFILE", "fast")
+
+
+@lru_cache(maxsize=None)
+def linear_supported() -> bool:
+    with fitz.open() as doc:
+        doc.new_page()
+        try:
+            doc.tobytes(linear=True)
+        except Exception:
+            return False
+    return True
+
+
+def resolve_save_profile(
+    profile: Union[None, str, SaveProfile] = None,
+) -> SaveProfile:
+    if profile is None:
+        profile = DEFAULT_SAVE_PROFILE
+    if isinstance(profile, SaveProfile):
+        return profile
+    try:
+        return SAVE_PROFILES[profile]
+    except KeyError:
+        raise ValueError(
+            f"unknown save profile {profile!r}; "
+            f"expected one of {sorted(SAVE_PROFILES)}"
+        ) from None
+
+
+# a path (MuPDF writes the file itself) or a seekable binary file object
+Dest = Union[str, Path, BinaryIO]
+
+
+class _Stream:
+    # Document.save() swaps any file object that has a .name for that name,
+    # which for os.fdopen() handles is the descriptor number; this hides it
+    # so MuPDF writes through the object
+
+    __slots__ = ("_f",)
+
+    def __init__(self, f: BinaryIO):
+        self._f = f
+
+    def write(self, b: bytes) -> int:
+        return self._f.write(b)
+
+    def seek(self, *args: int) -> int:
+        return self._f.seek(*args)
+
+    def tell(self) -> int:
+        return self._f.tell()
+
+    def truncate(self, *args: int) -> int:
+        return self._f.truncate(*args)
+
+
+def write_pdf(
+    doc: fitz.Document,
+    dest: Dest,
+    profile: Union[None, str, SaveProfile] = None,
+    stage_name: str = "save",
+    /,
+    **fields: Any,
+) -> int:
+    # the one place outputs are serialised; the stage event carries the
+    # profile name, so timings and sizes compare across profiles
+    profile = resolve_save_profile(profile)
+    with stage(stage_name, profile=profile.name, **fields) as ev:
+        if isinstance(dest, (str, Path)):
+            doc.save(str(dest), **profile.options())
+            ev["bytes"] = os.path.getsize(dest)
+        else:
+            start = dest.tell()
+            doc.save(_Stream(dest), **profile.options())
+            ev["bytes"] = dest.tell() - start
+    return ev["bytes"]
+
+
+def save_pdf(
+    doc: fitz.Document,
+    profile: Union[None, str, SaveProfile] = None,
+    stage_name: str = "save",
+    /,
+    **fields: Any,
+) -> bytes:
+    buf = io.BytesIO()
+    write_pdf(doc, buf, profile, stage_name, **fields)
+    return buf.getvalue()
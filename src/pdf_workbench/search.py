@@ -0,0 +1,203 @@
+import os
+import pickle
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+import pymupdf as fitz
+
+from .cache import DiskCache, cache_key, cache_root
+from .docpool import Source, doc_pool, source_key
+from .profiling import stage
+
+SEARCH_CACHE_MB = int(os.environ.get("PDF_WORKBENCH_SEARCH_CACHE_MB", "256"))
+# bump when tokenisation or the record layout changes
+INDEX_VERSION = 1
+
+search_cache = DiskCache(cache_root() / "search", SEARCH_CACHE_MB << 20)
+
+_WORD = re.compile(r"\w+")
+# "a phrase", -excluded, prefix*, word
+_TERM = re.compile(r'(-?)"([^"]*)"?|(\S+)')
+
+
+def normalize(text: str) -> str:
+    # NFKC folds ligatures and full-width forms, so "ﬁle" finds "file"
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def tokens(text: str) -> List[str]:
+    return _WORD.findall(normalize(text))
+
+
+class TextIndex:
+    # Inverted index over one document's page text: word -> sorted pages.
+    # Each page also keeps its words joined by single spaces, so a phrase is
+    # checked with one substring test on the pages holding all its words.
+
+    __slots__ = ("num_pages", "postings", "texts")
+
+    def __init__(
+        self, num_pages: int, postings: Dict[str, List[int]], texts: List[str]
+    ):
+        self.num_pages = num_pages
+        self.postings = postings
+        self.texts = texts
+
+    @classmethod
+    def from_texts(cls, page_texts: List[str]) -> "TextIndex":
+        postings: Dict[str, List[int]] = {}
+        texts: List[str] = []
+        for pno, text in enumerate(page_texts):
+            words = tokens(text)
+            for w in dict.fromkeys(words):
+                postings.setdefault(w, []).append(pno)
+            texts.append(f" {' '.join(words)} ")
+        return cls(len(page_texts), postings, texts)
+
+    def to_record(self) -> bytes:
+        return pickle.dumps(
+            (INDEX_VERSION, self.num_pages, self.postings, self.texts),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+    @classmethod
+    def from_record(cls, blob: bytes) -> "Optional[TextIndex]":
+        try:
+            version, num_pages, postings, texts = pickle.loads(blob)
+        except Exception:
+            return None
+        if version != INDEX_VERSION:
+            return None
+        return cls(num_pages, postings, texts)
+
+    def _word(self, word: str) -> Set[int]:
+        if word.endswith("*") and len(word) > 1:
+            stem = word[:-1]
+            found: Set[int] = set()
+            for w, pages in self.postings.items():
+                if w.startswith(stem):
+                    found.update(pages)
+            return found
+        return set(self.postings.get(word, ()))
+
+    def _phrase(self, words: List[str]) -> Set[int]:
+        pages = self._word(words[0])
+        for w in words[1:]:
+            pages &= self._word(w)
+        if len(words) > 1 and pages:
+            # a trailing word* only has to start the last word
+            needle = f" {' '.join(words)} "
+            if needle.endswith("* "):
+                needle = needle[:-2]
+            pages = {p for p in pages if needle in self.texts[p]}
+        return pages
+
+    def search(self, query: str) -> List[int]:
+        # 0-based pages holding every word and "quoted phrase" of the
+        # query and none of its -excluded ones; word* matches a prefix
+        include: List[List[str]] = []
+        exclude: List[List[str]] = []
+        for neg, phrase, word in _TERM.findall(normalize(query)):
+            if word.startswith("-"):
+                neg, word = "-", word[1:]
+            text = phrase or word
+            words = _WORD.findall(text)
+            if words and text.endswith("*"):
+                words[-1] += "*"
+            if words:
+                (exclude if neg else include).append(words)
+        if not include:
+            return []
+        pages = self._phrase(include[0])
+        for words in include[1:]:
+            if not pages:
+                break
+            pages &= self._phrase(words)
+        for words in exclude:
+            pages -= self._phrase(words)
+        return sorted(pages)
+
+
+def build_text_index(doc: fitz.Document) -> TextIndex:
+    texts = []
+    for page in doc:
+        with stage("search.page_text", page=page.number):
+            texts.append(page.get_text("text"))
+    return TextIndex.from_texts(texts)
+
+
+_loaded: "OrderedDict[str, TextIndex]" = OrderedDict()
+_loaded_lock = threading.Lock()
+# parsed indexes kept in memory, so a query on every rerun is a dict lookup
+_LOADED_MAX = 16
+
+
+def _remember(key: str, index: TextIndex) -> TextIndex:
+    with _loaded_lock:
+        _loaded[key] = index
+        _loaded.move_to_end(key)
+        while len(_loaded) > _LOADED_MAX:
+            _loaded.popitem(last=False)
+    return index
+
+
+def _index_key(key: str) -> str:
+    return cache_key("search", INDEX_VERSION, key)
+
+
+def store_text_index(key: str, index: TextIndex) -> TextIndex:
+    # for callers that already have the page text (ingestion does)
+    with stage("search.store") as ev:
+        blob = index.to_record()
+        ev["bytes"] = len(blob)
+        search_cache.put(_index_key(key), blob)
+    return _remember(key, index)
+
+
+def text_index(
+    src: Source, key: Optional[str] = None, cache: bool = True
+) -> TextIndex:
+    # built once per distinct document (by content hash) and kept on disk
+    key = key or source_key(src)
+    if cache:
+        with _loaded_lock:
+            index = _loaded.get(key)
+            if index is not None:
+                _loaded.move_to_end(key)
+                return index
+        with stage("search.load") as ev:
+            blob = search_cache.get(_index_key(key))
+            ev["bytes"] = len(blob) if blob else 0
+        index = TextIndex.from_record(blob) if blob else None
+        if index is not None:
+            return _remember(key, index)
+    with stage("search.index") as ev:
+        with doc_pool.checkout(src, key) as doc:
+            index = build_text_index(doc)
+        ev["pages"] = index.num_pages
+    if cache:
+        store_text_index(key, index)
+    return index
+
+
+def search_pages(
+    src: Source, query: str, key: Optional[str] = None, cache: bool = True
+) -> List[int]:
+    with stage("search.query"):
+        return text_index(src, key, cache).search(query)
+
+
+def search_documents(
+    docs: List[Tuple[str, Source]], query: str
+) -> Dict[str, List[int]]:
+    # {name: matching pages} for every document with at least one match;
+    # the shape merge and filter selections take
+    found: Dict[str, List[int]] = {}
+    for name, src in docs:
+        pages = search_pages(src, query)
+        if pages:
+            found[name] = pages
+    return found
@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+import pymupdf as fitz
+
+# how far from axis-aligned a segment may be and still count as a ruling
+AXIS_TOL = 1.0
+
+
+@dataclass(frozen=True)
+class TableScreen:
+    # Cheap PyMuPDF pre-screen for the pdfplumber table pass.
+    # extract_tables() with its default "lines" strategy builds cells only
+    # from ruling lines and rectangle edges, so a page needs at least two
+    # horizontal and two vertical edges before it can yield a table.
+    min_edge_len: float = 3.0  # pdfplumber's edge_min_length
+    min_h_edges: int = 2
+    min_v_edges: int = 2
+    # Optional text-layout trigger for borderless tables: a page also counts
+    # when at least min_text_rows rows hold min_text_columns or more
+    # separate text lines side by side. 0 turns it off, which matches the
+    # "lines" strategy the extractor uses.
+    min_text_columns: int = 0
+    min_text_rows: int = 3
+
+
+def _segments(item: tuple) -> Iterable[Tuple[tuple, tuple]]:
+    kind = item[0]
+    if kind == "re":
+        x0, y0, x1, y1 = item[1]
+        pts = [(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)]
+    elif kind == "qu":
+        ul, ur, ll, lr = item[1]
+        pts = [ul, ur, lr, ll, ul]
+    else:
+        # "l" and "c"; pdfplumber also turns curve points into edges
+        pts = item[1:]
+    return zip(pts, pts[1:])
+
+
+def ruling_edges(
+    page: fitz.Page,
+    min_len: float = 3.0,
+    stop_at: Optional[Tuple[int, int]] = None,
+) -> Tuple[int, int]:
+    # (horizontal, vertical) segment counts from the page's vector drawings;
+    # stops early once both counts reach stop_at
+    h = v = 0
+    for path in page.get_cdrawings():
+        for item in path["items"]:
+            for (ax, ay), (bx, by) in _segments(item):
+                if abs(ay - by) <= AXIS_TOL and abs(ax - bx) >= min_len:
+                    h += 1
+                elif abs(ax - bx) <= AXIS_TOL and abs(ay - by) >= min_len:
+                    v += 1
+            if stop_at and h >= stop_at[0] and v >= stop_at[1]:
+                return h, v
+    return h, v
+
+
+def aligned_text_rows(page: fitz.Page, min_columns: int) -> int:
+    # rows (4pt bands) holding at least min_columns text lines side by side
+    lines: Dict[Tuple[int, int], float] = {}
+    for x0, y0, x1, y1, _, block, line, _ in page.get_text("words"):
+        lines.setdefault((block, line), y0)
+    rows: Dict[int, int] = {}
+    for y0 in lines.values():
+        band = round(y0 / 4)
+        rows[band] = rows.get(band, 0) + 1
+    return sum(1 for n in rows.values() if n >= min_columns)
+
+
+def is_table_candidate(page: fitz.Page, screen: TableScreen) -> bool:
+    h, v = ruling_edges(
+        page, screen.min_edge_len, (screen.min_h_edges, screen.min_v_edges)
+    )
+    if h >= screen.min_h_edges and v >= screen.min_v_edges:
+        return True
+    if screen.min_text_columns > 0:
+        rows = aligned_text_rows(page, screen.min_text_columns)
+        return rows >= screen.min_text_rows
+    return False
@@ -0,0 +1,250 @@
+import io
+import os
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import pymupdf as fitz
+
+from .cache import DiskCache, cache_key, cache_root
+from .docpool import Source, doc_pool, source_key
+from .profiling import stage
+
+THUMB_CACHE_MB = int(os.environ.get("PDF_WORKBENCH_THUMB_CACHE_MB", "512"))
+
+thumb_cache = DiskCache(cache_root() / "thumbs", THUMB_CACHE_MB << 20)
+
+THUMB_FORMATS = ("png", "jpeg", "webp")
+# preview levels as divisors of the rendered size. A page is rasterised
+# once at "large"; the smaller levels are downscaled from that raster.
+PYRAMID: Dict[str, int] = {"large": 1, "medium": 2, "small": 3}
+
+# Pillow save() arguments; WebP's default effort (4) takes 2.5x as long as
+# 2 for a few percent smaller previews
+_PIL_FORMATS: Dict[str, Tuple[str, Dict[str, Any]]] = {
+    "jpeg": ("JPEG", {}),
+    "webp": ("WEBP", {"method": 2}),
+}
+
+
+@lru_cache(maxsize=None)
+def _pillow() -> Any:
+    # optional: faster JPEG and the only WebP encoder; MuPDF writes PNG
+    # and JPEG without it
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def thumb_formats() -> Tuple[str, ...]:
+    return THUMB_FORMATS if _pillow() is not None else ("png", "jpeg")
+
+
+@dataclass(frozen=True)
+class ThumbParams:
+    zoom: float = 1.5
+    max_w: Optional[int] = None
+    gray: bool = False
+    # "png" is lossless; "jpeg" and "webp" use `quality` (1-100) and are
+    # far smaller for scans and photos
+    fmt: str = "png"
+    quality: int = 75
+
+    def __post_init__(self):
+        if self.fmt not in THUMB_FORMATS:
+            raise ValueError(
+                f"unknown thumbnail format {self.fmt!r}; "
+                f"expected one of {THUMB_FORMATS}"
+            )
+        if not 1 <= self.quality <= 100:
+            raise ValueError(
+                f"thumbnail quality must be 1-100, got {self.quality}"
+            )
+
+    @property
+    def mime(self) -> str:
+        return f"image/{self.fmt}"
+
+    @property
+    def suffix(self) -> str:
+        return ".jpg" if self.fmt == "jpeg" else f".{self.fmt}"
+
+    def token(self) -> str:
+        base = f"z{self.zoom:g}-w{self.max_w or 0}-g{int(self.gray)}"
+        if self.fmt == "png":
+            return f"{base}-png"
+        return f"{base}-{self.fmt}-q{self.quality}"
+
+
+def thumb_key(
+    doc_key: str, page_idx: int, params: ThumbParams, level: str = "large"
+) -> str:
+    token = params.token()
+    if level != "large":
+        token = f"{token}-{level}"
+    return cache_key(doc_key, page_idx, token)
+
+
+def thumb_matrix(page: fitz.Page, params: ThumbParams) -> fitz.Matrix:
+    zoom = params.zoom
+    if params.max_w:
+        # page.rect is already rotated, so this is the displayed width
+        zoom = min(zoom, params.max_w / page.rect.width)
+    return fitz.Matrix(zoom, zoom)
+
+
+def encode_levels(
+    pix: fitz.Pixmap, params: ThumbParams, levels: Sequence[str] = ("large",)
+) -> Dict[str, bytes]:
+    # one encoded image per pyramid level, all from this one raster
+    Image = _pillow() if params.fmt != "png" else None
+    out: Dict[str, bytes] = {}
+    if Image is None:
+        if params.fmt == "webp":
+            raise RuntimeError("WebP thumbnails need Pillow")
+        for level in levels:
+            n = PYRAMID[level]
+            if n > 1:
+                level_pix = fitz.Pixmap(
+                    pix, max(1, pix.width // n), max(1, pix.height // n), None
+                )
+            else:
+                level_pix = pix
+            if params.fmt == "png":
+                out[level] = level_pix.tobytes("png")
+            else:
+                out[level] = level_pix.tobytes(
+                    "jpeg", jpg_quality=params.quality
+                )
+        return out
+    # a view onto the samples; reduce() makes the smaller levels
+    mode = "L" if pix.n == 1 else "RGB"
+    size = (pix.width, pix.height)
+    img = Image.frombuffer(
+        mode, size, pix.samples_mv, "raw", mode, pix.stride, 1
+    )
+    pil_format, opts = _PIL_FORMATS[params.fmt]
+    for level in levels:
+        n = PYRAMID[level]
+        buf = io.BytesIO()
+        (img.reduce(n) if n > 1 else img).save(
+            buf, pil_format, quality=params.quality, **opts
+        )
+        out[level] = buf.getvalue()
+    return out
+
+
+def render_pyramid(
+    doc: fitz.Document,
+    pages: Sequence[int],
+    params: ThumbParams,
+    levels: Sequence[str] = tuple(PYRAMID),
+) -> List[Dict[str, bytes]]:
+    cs = fitz.csGRAY if params.gray else fitz.csRGB
+    out: List[Dict[str, bytes]] = []
+    for pno in pages:
+        with stage("render.page", page=pno, fmt=params.fmt) as ev:
+            page = doc[pno]
+            pix = page.get_pixmap(
+                matrix=thumb_matrix(page, params), colorspace=cs, alpha=False
+            )
+            out.append(encode_levels(pix, params, levels))
+            ev["bytes"] = sum(len(b) for b in out[-1].values())
+    return out
+
+
+def render_pages(
+    doc: fitz.Document, pages: Sequence[int], params: ThumbParams
+) -> List[bytes]:
+    return [p["large"] for p in render_pyramid(doc, pages, params, ("large",))]
+
+
+def get_thumbnails(
+    src: Source,
+    pages: Sequence[int],
+    params: ThumbParams,
+    key: Optional[str] = None,
+    level: str = "large",
+) -> List[bytes]:
+    # Asking for a smaller level renders and caches the whole pyramid, so
+    # enlarging a grid thumbnail later is a cache hit; "large" alone
+    # renders only itself.
+    if level not in PYRAMID:
+        raise ValueError(
+            f"unknown preview level {level!r}; "
+            f"expected one of {tuple(PYRAMID)}"
+        )
+    key = key or source_key(src)
+    levels = ("large",) if level == "large" else tuple(PYRAMID)
+    out: List[Optional[bytes]] = []
+    missing: List[int] = []
+    with stage("thumbs.cache_lookup") as ev:
+        for i, pno in enumerate(pages):
+            blob = thumb_cache.get(thumb_key(key, pno, params, level))
+            if blob is None:
+                missing.append(i)
+            out.append(blob)
+        ev["hits"] = len(pages) - len(missing)
+        ev["misses"] = len(missing)
+
+    if missing:
+        with doc_pool.checkout(src, key) as doc:
+            # a warm-up holding the same handle may have got here first
+            todo = []
+            for i in missing:
+                out[i] = thumb_cache.get(
+                    thumb_key(key, pages[i], params, level)
+                )
+                if out[i] is None:
+                    todo.append(i)
+            rendered = render_pyramid(
+                doc, [pages[i] for i in todo], params, levels
+            )
+            for i, blobs in zip(todo, rendered):
+                for lvl, blob in blobs.items():
+                    lvl_key = thumb_key(key, pages[i], params, lvl)
+                    thumb_cache.put(lvl_key, blob)
+                out[i] = blobs[level]
+    return out  # type: ignore[return-value]
+
+
+_warming: Set[Tuple[str, ThumbParams, str]] = set()
+_warming_lock = threading.Lock()
+
+
+def warm_thumbnails(
+    src: Source,
+    pages: Sequence[int],
+    params: ThumbParams,
+    key: Optional[str] = None,
+    level: str = "large",
+) -> Optional[threading.Thread]:
+    key = key or source_key(src)
+    todo = [
+        p for p in pages if thumb_key(key, p, params, level) not in thumb_cache
+    ]
+    if not todo:
+        return None
+    job = (key, params, level)
+    with _warming_lock:
+        if job in _warming:
+            return None
+        _warming.add(job)
+
+    def run() -> None:
+        try:
+            # small batches so foreground renders can interleave on the handle
+            for i in range(0, len(todo), 8):
+                get_thumbnails(src, todo[i : i + 8], params, key, level)
+        except Exception:
+            pass
+        finally:
+            with _warming_lock:
+                _warming.discard(job)
+
+    t = threading.Thread(target=run, name="thumb-warmup", daemon=True)
+    t.start()
+    return t
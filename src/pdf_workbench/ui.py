@@ -0,0 +1,400 @@
+import math
+from typing import Any, List, Optional, Set, Tuple
+
+import streamlit as st
+
+from .basic_ops import format_pages
+from .docpool import Source, doc_pool, source_key
+from .docstore import DocumentStore
+from .ingest import CONTENT_KINDS, doc_meta, known_meta
+from .jobs import CANCELLED, DONE, FAILED, Job, job_runner
+from .profiling import Recorder
+from .saving import linear_supported
+from .search import search_pages
+from .thumbs import ThumbParams, get_thumbnails, thumb_formats, warm_thumbnails
+
+CONTENT_LABELS = {
+    "text": "Pages with text",
+    "no_text": "Pages without a text layer",
+    "images": "Pages with images",
+    "tables": "Pages with a table",
+}
+
+
+def save_profile_label(name: str) -> str:
+    # MuPDF 1.24+ cannot linearise; "linear" then only saves compressed
+    # without object streams, so it is labelled by that
+    if name == "linear" and not linear_supported():
+        return "Compressed, no object streams"
+    return {
+        "fast": "Fast (no compression)",
+        "compact": "Compact (smallest file)",
+        "linear": "For the web (linearized)",
+    }.get(name, name)
+
+
+def session_doc_store() -> DocumentStore:
+    if "doc_store" not in st.session_state:
+        st.session_state["doc_store"] = DocumentStore()
+    return st.session_state["doc_store"]
+
+
+def session_jobs() -> List[Job]:
+    # this session's jobs, oldest first; ids of swept jobs are dropped
+    jobs = job_runner.jobs(st.session_state.get("job_ids", []))
+    st.session_state["job_ids"] = [j.id for j in jobs]
+    return jobs
+
+
+def track_job(job: Job) -> None:
+    st.session_state.setdefault("job_ids", []).append(job.id)
+
+
+def _unprepare(flag: str) -> None:
+    st.session_state[flag] = False
+
+
+def _job_download(job: Job) -> None:
+    # Streamlit copies download data into server memory on every render,
+    # so the output file is only read on the run after its Prepare button is clicked
+    # and dropped again once downloaded
+    flag = f"dl_ready_{job.id}"
+    if not st.session_state.get(flag):
+        if st.button(f"Prepare {job.file_name}", key=f"dl_prep_{job.id}"):
+            st.session_state[flag] = True
+            st.rerun()
+        return
+    with open(job.path, "rb") as fh:  # type: ignore[arg-type]
+        st.download_button(
+            f"Download {job.file_name}",
+            data=fh,
+            file_name=job.file_name,
+            mime=job.mime,
+            key=f"dl_{job.id}",
+            on_click=_unprepare,
+            args=(flag,),
+        )
+
+
+def _job_row(job: Job) -> None:
+    counts = f"{job.docs_done}/{job.docs_total} file(s)"
+    if job.pages_total:
+        counts += f", {job.pages_done}/{job.pages_total} page(s)"
+    if job.active:
+        text = f"**{job.label}** — {job.status}, {counts}"
+        if job.message:
+            text += f" — {job.message}"
+        st.progress(job.fraction, text=text)
+        if st.button("Cancel", key=f"cancel_{job.id}"):
+            job.cancel()
+        return
+
+    if job.status == DONE:
+        st.success(f"{job.label} ready!")
+        st.caption(
+            f"{job.size / 1e6:.2f} MB in "
+            f"{job.finished - (job.started or job.created):.1f} s"
+        )
+        _job_download(job)
+        if job.recorder is not None and job.recorder.events:
+            st.download_button(
+                "Download timings.json",
+                data=job.recorder.to_json(),
+                file_name="timings.json",
+                mime="application/json",
+                key=f"dl_timings_{job.id}",
+            )
+        if job.profile:
+            st.download_button(
+                "Download profile.prof",
+                data=job.profile,
+                file_name=f"{job.kind}.prof",
+                mime="application/octet-stream",
+                key=f"dl_prof_{job.id}",
+            )
+    elif job.status == FAILED:
+        st.error(f"{job.label} failed: {job.error}")
+    elif job.status == CANCELLED:
+        st.warning(f"{job.label} cancelled.")
+    if st.button("Dismiss", key=f"dismiss_{job.id}"):
+        job_runner.forget(job.id)
+        st.rerun()
+
+
+def st_jobs_panel(poll_s: float = 1.0) -> None:
+    # Finished jobs render with the page. Only queued and running ones sit
+    # in a fragment that polls; when one of them finishes the whole app
+    # reruns, so it moves out with its download and polling stops.
+    jobs = session_jobs()
+    for job in jobs:
+        if not job.active:
+            with st.container(border=True):
+                _job_row(job)
+    active_ids = [j.id for j in jobs if j.active]
+    if not active_ids:
+        return
+
+    @st.fragment(run_every=poll_s)
+    def panel() -> None:
+        running = job_runner.jobs(active_ids)
+        if any(not j.active for j in running) or not running:
+            st.rerun()
+        for job in running:
+            with st.container(border=True):
+                _job_row(job)
+
+    panel()
+
+
+def st_page_search(
+    source: Source, key_prefix: str, doc_key: Optional[str] = None
+) -> List[int]:
+    # pages matching the query typed here, from the document's text index
+    query = st.text_input(
+        "Find pages",
+        key=f"{key_prefix}_query",
+        placeholder='words, "a phrase", -exclude, prefix*',
+    )
+    if not query.strip():
+        return []
+    hits = search_pages(source, query, doc_key)
+    if hits:
+        st.caption(f"{len(hits)} page(s) match: {format_pages(hits)}")
+    else:
+        st.caption("No page matches.")
+    return hits
+
+
+def st_thumb_sidebar(key_prefix: str = "thumbs") -> Tuple[str, int]:
+    # (format, quality) for page previews; JPEG/WebP cut the bytes every
+    # rerun sends to the browser, most of all for scanned pages
+    formats = thumb_formats()
+    with st.sidebar:
+        st.subheader("Thumbnails")
+        fmt = st.selectbox(
+            "Encoding",
+            formats,
+            index=formats.index("jpeg"),
+            format_func=lambda f: {
+                "png": "PNG (lossless)",
+                "jpeg": "JPEG",
+                "webp": "WebP (smallest)",
+            }[f],
+            key=f"{key_prefix}_fmt",
+        )
+        quality = st.slider(
+            "Quality",
+            30,
+            95,
+            75,
+            step=5,
+            key=f"{key_prefix}_quality",
+            disabled=fmt == "png",
+        )
+    return fmt, quality
+
+
+def payload_caption(blobs: List[bytes], params: ThumbParams) -> str:
+    total = sum(len(b) for b in blobs)
+    enc = params.fmt
+    if params.fmt != "png":
+        enc += f" q{params.quality}"
+    return (
+        f"Preview payload: {total / 1024:.0f} KB for {len(blobs)} "
+        f"thumbnail(s), {enc}"
+    )
+
+
+@st.dialog("Page preview", width="large")
+def _enlarged_page(
+    source: Source, page_idx: int, params: ThumbParams, doc_key: str
+) -> None:
+    # the full-size level is only fetched here; the grid uses "small"
+    img = get_thumbnails(source, [page_idx], params, doc_key)[0]
+    st.image(img, caption=f"Page {page_idx + 1}", use_container_width=True)
+    st.caption(f"{len(img) / 1024:.0f} KB")
+
+
+def _sync_page_checkbox(sel_key: str, box_key: str, page_idx: int) -> None:
+    selected = st.session_state[sel_key]
+    if st.session_state[box_key]:
+        selected.add(page_idx)
+    else:
+        selected.discard(page_idx)
+
+
+def st_page_selector(
+    file_label: str,
+    source: Source,
+    key_prefix: str,
+    page_size: int = 24,
+    zoom: float = 1.5,
+    doc_key: Optional[str] = None,
+    fmt: str = "png",
+    quality: int = 75,
+) -> List[int]:
+    doc_key = doc_key or source_key(source)
+    meta = known_meta(doc_key)
+    num_pages = meta.pages if meta else doc_pool.page_count(source, doc_key)
+    # rendered once at `zoom`; the grid shows the small level of it
+    params = ThumbParams(zoom=zoom, fmt=fmt, quality=quality)
+
+    # selection lives outside the checkboxes so pages outside the visible
+    # window keep their state when their widgets are not rendered
+    sel_key = f"{key_prefix}_selected"
+    if sel_key not in st.session_state:
+        st.session_state[sel_key] = set()
+    selected: Set[int] = st.session_state[sel_key]
+
+    st.markdown(f"**{file_label}** — {num_pages} page(s)")
+    left, right = st.columns([1, 1])
+    with left:
+        if st.button("Select all", key=f"{key_prefix}_select_all"):
+            selected.update(range(num_pages))
+            st.rerun()
+    with right:
+        if st.button("Clear all", key=f"{key_prefix}_clear_all"):
+            selected.clear()
+            st.rerun()
+
+    hits = st_page_search(source, key_prefix, doc_key)
+    if hits:
+        left, right = st.columns([1, 1])
+        with left:
+            if st.button("Select matches", key=f"{key_prefix}_select_hits"):
+                selected.update(hits)
+                st.rerun()
+        with right:
+            if st.button("Deselect matches", key=f"{key_prefix}_clear_hits"):
+                selected.difference_update(hits)
+                st.rerun()
+
+    left, right = st.columns([2, 1], vertical_alignment="bottom")
+    kind = left.selectbox(
+        "Select by content",
+        CONTENT_KINDS,
+        format_func=CONTENT_LABELS.__getitem__,
+        key=f"{key_prefix}_content",
+    )
+    if right.button("Select", key=f"{key_prefix}_select_content"):
+        # waits for the upload's background metadata read if still running
+        selected.update(doc_meta(source, doc_key).select(kind))
+        st.rerun()
+
+    num_windows = max(1, math.ceil(num_pages / page_size))
+    window = 0
+    if num_windows > 1:
+        window = st.selectbox(
+            "Pages",
+            range(num_windows),
+            format_func=lambda w: (
+                f"{w * page_size + 1}–{min((w + 1) * page_size, num_pages)}"
+            ),
+            key=f"{key_prefix}_window",
+        )
+    start = window * page_size
+    end = min(start + page_size, num_pages)
+
+    cols_per_row = 4
+    slots: List[Tuple[int, Any]] = []
+    payload = st.empty()
+    with st.container(height=600, border=True):
+        for row_start in range(start, end, cols_per_row):
+            cols = st.columns(cols_per_row, vertical_alignment="top")
+            for offset in range(cols_per_row):
+                idx = row_start + offset
+                if idx >= end:
+                    continue
+                with cols[offset]:
+                    slot = st.empty()
+                    slot.caption(f"Page {idx + 1} …")
+                    slots.append((idx, slot))
+                    box_key = f"{key_prefix}_p{idx}"
+                    st.session_state[box_key] = idx in selected
+                    st.checkbox(
+                        "Select",
+                        key=box_key,
+                        on_change=_sync_page_checkbox,
+                        args=(sel_key, box_key, idx),
+                    )
+                    if st.button("Enlarge", key=f"{key_prefix}_zoom{idx}"):
+                        _enlarged_page(source, idx, params, doc_key)
+
+    # layout and checkboxes are up; fill thumbnails in page order
+    shown: List[bytes] = []
+    for idx, slot in slots:
+        img = get_thumbnails(source, [idx], params, doc_key, "small")[0]
+        slot.image(img, caption=f"Page {idx + 1}", use_container_width=True)
+        shown.append(img)
+    payload.caption(payload_caption(shown, params))
+
+    warm_thumbnails(
+        source,
+        range(end, min(end + page_size, num_pages)),
+        params,
+        doc_key,
+        "small",
+    )
+
+    return sorted(i for i in selected if i < num_pages)
+
+
+def st_profiling_sidebar() -> Optional[Recorder]:
+    # opt-in per-stage timings for this run; None keeps stage() a no-op
+    with st.sidebar:
+        st.subheader("Profiling")
+        if not st.toggle("Record timings", key="profiling_enabled"):
+            return None
+        use_cprofile = st.checkbox("Include cProfile", key="profiling_cprofile")
+    return Recorder(profile=use_cprofile)
+
+
+def st_profiling_panel(rec: Optional[Recorder]) -> None:
+    if rec is None:
+        return
+    with st.sidebar:
+        if not rec.events:
+            st.caption("No stages recorded in this run.")
+            return
+        st.caption("Per stage (this run)")
+        st.dataframe(
+            [
+                {
+                    "stage": r["stage"],
+                    "calls": r["calls"],
+                    "ms": round(r["seconds"] * 1000, 1),
+                    "MB": round(r["bytes"] / 1e6, 2),
+                }
+                for r in rec.summary()
+            ],
+            hide_index=True,
+        )
+        slow = rec.slowest_pages(10)
+        if slow:
+            st.caption("Slowest pages")
+            st.dataframe(
+                [
+                    {
+                        "doc": r["doc"],
+                        "page": r["page"],
+                        "ms": round(r["seconds"] * 1000, 1),
+                    }
+                    for r in slow
+                ],
+                hide_index=True,
+            )
+        st.download_button(
+            "Download timings.json",
+            data=rec.to_json(),
+            file_name="timings.json",
+            mime="application/json",
+            key="dl_profiling_json",
+        )
+        if rec.profiler is not None:
+            st.download_button(
+                "Download cProfile dump",
+                data=rec.profile_stats(),
+                file_name="profile.prof",
+                mime="application/octet-stream",
+                key="dl_profiling_prof",
+            )